@@ -1,8 +1,21 @@
 """
 Assign Multiple Product Images
 Each product gets 4 unique images based on its category/type
+
+Incremental: only products that are new, whose productname changed, or
+whose images were changed elsewhere since assignment are processed (name
+and image hashes in the image_assignment_state table of gmc_state.db), and
+products.json is rewritten only if an image changed.
 """
+import hashlib
 import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import database
+from catalog import write_catalog
 
 # Category-based images from Unsplash (4 images per category)
 CATEGORY_IMAGES = {
@@ -44,81 +57,164 @@ CATEGORY_IMAGES = {
     ]
 }
 
+# Keywords per category, in priority order: the first category with a
+# keyword anywhere in the name wins
+CATEGORY_KEYWORDS = (
+    ('rice', ('rice', 'basmati')),
+    ('salt', ('salt',)),
+    ('oil', ('oil', 'coconut')),
+    ('turmeric', ('turmeric', 'spice', 'powder')),
+    ('honey', ('honey',)),
+)
+
+_KEYWORD_RANK = {kw: rank for rank, (_, kws) in enumerate(CATEGORY_KEYWORDS) for kw in kws}
+# Zero-width lookahead so overlapping keywords are all seen in one pass
+_CATEGORY_RE = re.compile('(?=(' + '|'.join(
+    re.escape(kw) for kw in sorted(_KEYWORD_RANK, key=len, reverse=True)) + '))')
+_BATCH_RE = re.compile(r'(?=batch ([1-8]))')
+
+# Changing the images or keywords re-processes every product
+RULES_HASH = hashlib.sha1(json.dumps([CATEGORY_IMAGES, CATEGORY_KEYWORDS]).encode('utf-8')).hexdigest()
+
 def get_category(product_name):
     """Determine category from product name"""
-    name = product_name.lower()
-    if 'rice' in name or 'basmati' in name:
-        return 'rice'
-    elif 'salt' in name:
-        return 'salt'
-    elif 'oil' in name or 'coconut' in name:
-        return 'oil'
-    elif 'turmeric' in name or 'spice' in name or 'powder' in name:
-        return 'turmeric'
-    elif 'honey' in name:
-        return 'honey'
-    return 'default'
+    ranks = [_KEYWORD_RANK[m.group(1)] for m in _CATEGORY_RE.finditer(product_name.lower())]
+    return CATEGORY_KEYWORDS[min(ranks)][0] if ranks else 'default'
 
 def get_batch_number(product_name):
-    """Extract batch number from product name"""
-    name = product_name.lower()
-    if 'batch 1' in name:
-        return 0
-    elif 'batch 2' in name:
-        return 1
-    elif 'batch 3' in name:
-        return 2
-    elif 'batch 4' in name:
-        return 3
-    elif 'batch 5' in name:
-        return 0
-    elif 'batch 6' in name:
-        return 1
-    elif 'batch 7' in name:
-        return 2
-    elif 'batch 8' in name:
-        return 3
-    return 0
+    """Extract batch number from product name ('batch 1'..'batch 8' -> image 0-3)"""
+    digits = [int(m.group(1)) for m in _BATCH_RE.finditer(product_name.lower())]
+    return (min(digits) - 1) % 4 if digits else 0
+
+def name_hash(product_name):
+    return hashlib.sha1(f"{RULES_HASH}:{product_name}".encode('utf-8')).hexdigest()
+
+def images_hash(product):
+    """Digest of the image fields as they stand, to notice images cleared or edited elsewhere."""
+    images = [product.get('featured_img'), product.get('additional_images'),
+              [v.get('featured_img') for v in product.get('variants') or []]]
+    return hashlib.sha1(json.dumps(images).encode('utf-8')).hexdigest()
+
+def classify_names(names):
+    """[(index, name)] -> [(index, category, batch)]. Runs in pool workers."""
+    return [(idx, get_category(name), get_batch_number(name)) for idx, name in names]
+
+def iter_classified(names, workers=1, chunk_size=20000):
+    """Yield classify_names results per chunk; on a process pool when workers > 1."""
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield classify_names(chunk)
+        return
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for results in pool.map(classify_names, chunks):
+            yield results
+
+def apply_images(product, category, batch):
+    """Set the product's images. Returns True if anything changed."""
+    images = CATEGORY_IMAGES.get(category, CATEGORY_IMAGES['default'])
+    # Get image based on batch number (cycles through 4 images)
+    img_url = images[batch % len(images)]
+    changed = False
+
+    # Set main image
+    if product.get('featured_img') != img_url:
+        product['featured_img'] = img_url
+        changed = True
+
+    # Set additional images array (4 images)
+    if product.get('additional_images') != images:
+        product['additional_images'] = list(images)
+        changed = True
+
+    # Update variant images too
+    for j, v in enumerate(product.get('variants') or []):
+        if v.get('featured_img') != images[j % len(images)]:
+            v['featured_img'] = images[j % len(images)]
+            changed = True
+    return changed
+
+def update_images(products, conn, workers=1, force=False, verbose=False):
+    """
+    Assign images to the new and renamed products of a loaded catalog,
+    recording them in image_assignment_state (caller commits).
+    Returns (processed, codes of products whose images changed).
+    """
+    done = {code: (digest, images) for code, digest, images
+            in conn.execute('SELECT code, name_hash, images_hash FROM image_assignment_state')}
+
+    # Only products that are new, renamed or whose images changed since they
+    # were assigned (or everything with force)
+    todo = []
+    hashes = {}
+    for idx, p in enumerate(products):
+        name = p.get('productname', '')
+        digest = name_hash(name)
+        if force or done.get(p.get('code')) != (digest, images_hash(p)):
+            todo.append((idx, name))
+            hashes[idx] = digest
+
+    changed = []
+    rows = []
+    for results in iter_classified(todo, workers):
+        for idx, category, batch in results:
+            p = products[idx]
+            if apply_images(p, category, batch):
+                changed.append(p.get('code'))
+            if verbose:
+                print(f"  {p.get('code')}: {category} -> Batch {batch+1} image")
+            if p.get('code'):
+                rows.append((p['code'], hashes[idx], images_hash(p), category, batch, time.time()))
+
+    conn.executemany('''INSERT OR REPLACE INTO image_assignment_state
+                        (code, name_hash, images_hash, category, batch, assigned_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''', rows)
+    live = {p.get('code') for p in products}
+    conn.executemany('DELETE FROM image_assignment_state WHERE code=?',
+                     [(code,) for code in done if code not in live])
+    return len(todo), changed
+
+def assign_images(path='products.json', workers=1, force=False, verbose=False):
+    """
+    Assign images to new products and products whose name changed.
+    Returns (processed, changed, total).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    products = data.get('products', [])
+
+    database.init_db()
+    conn = database.connect()
+    try:
+        processed, changed = update_images(products, conn, workers, force, verbose)
+
+        # Save back (only if some product actually changed)
+        if changed:
+            write_catalog(data, path)
+        conn.commit()
+    finally:
+        conn.close()
+    return processed, len(changed), len(products)
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Assign category-based images to new or renamed products')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true', help='Re-process every product')
+    parser.add_argument('--verbose', action='store_true', help='Print every processed product')
+    args = parser.parse_args()
+
     try:
-        with open('products.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            products = data.get('products', [])
-            
-        print(f"Total products: {len(products)}")
-        updated = 0
-        
-        for p in products:
-            name = p.get('productname', '')
-            category = get_category(name)
-            batch = get_batch_number(name)
-            
-            images = CATEGORY_IMAGES.get(category, CATEGORY_IMAGES['default'])
-            # Get image based on batch number (cycles through 4 images)
-            img_url = images[batch % len(images)]
-            
-            # Set main image
-            p['featured_img'] = img_url
-            
-            # Set additional images array (4 images)
-            p['additional_images'] = images
-            
-            # Update variant images too
-            if 'variants' in p:
-                for j, v in enumerate(p['variants']):
-                    v['featured_img'] = images[j % len(images)]
-            
-            updated += 1
-            print(f"  {p['code']}: {category} -> Batch {batch+1} image")
-                
-        # Save back
-        with open('products.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-            
-        print(f"\n✅ Updated {updated} products with category-based images")
-        print("Each product now has 4 additional images in 'additional_images' field")
-        
+        start = time.time()
+        processed, changed, total = assign_images(workers=args.workers, force=args.force, verbose=args.verbose)
+
+        print(f"Total products: {total}")
+        print(f"\n✅ Processed {processed} new/renamed products, updated images of {changed} "
+              f"({time.time() - start:.2f}s)")
+        if not changed:
+            print("products.json unchanged")
+
     except Exception as e:
         print(f"Error: {e}")
 
@@ -0,0 +1,466 @@
+"""
+Catalog - In-memory view of products.json
+Parsed once and indexed, so the web server can load it in the master
+process and share it copy-on-write with forked workers.
+
+Each snapshot also carries a FacetIndex (posting lists / bitmaps and
+precomputed counts) for filtered browsing on /api/products.
+
+Writers go through write_catalog() (temp file + fsync + rename), so readers
+only ever see a complete file; CatalogStore swaps in a new immutable
+snapshot in the background when the file changes.
+
+Push and pricing jobs use load_records() instead: compact ProductRecord
+objects holding only the fields the GMC payload needs.
+"""
+import sys
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+CATALOG_FILE = 'products.json'
+STORE_URL = 'https://gmc-dashboard.vercel.app'
+
+# Attributes /api/products can filter and count on
+FACET_FIELDS = ('category_id', 'brand_id', 'vendor_id', 'free_shipping')
+PRICE_FIELD = 'minprice'
+
+def facet_key(value):
+    """Facet value as it appears in query strings ('5', 'true')."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _to_bitmap(ordinals, size):
+    buf = bytearray((size + 7) // 8)
+    for i in ordinals:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+class FacetIndex:
+    """
+    Posting lists per facet value, built once per snapshot. Values held by at
+    least 1/32 of the catalog are kept as int bitmaps (bit i = product i),
+    rarer ones as sorted array('I') of ordinals; filters combine as bitmap
+    AND/OR. Unfiltered facet counts are precomputed.
+    """
+
+    def __init__(self, products):
+        self.size = len(products)
+        self.all = (1 << self.size) - 1
+        dense_min = max(1, self.size // 32)
+
+        lists = {field: {} for field in FACET_FIELDS}
+        for i, p in enumerate(products):
+            for field in FACET_FIELDS:
+                value = p.get(field)
+                if value is not None:
+                    lists[field].setdefault(facet_key(value), []).append(i)
+
+        self.postings = {}
+        self.counts = {}
+        # Per field: sparse value of each product (index into sparse_values, -1 = dense/none)
+        self.sparse_values = {}
+        self.sparse_codes = {}
+        self.sparse_total = {}
+        for field, values in lists.items():
+            self.postings[field] = {}
+            codes = array('i', [-1]) * self.size
+            names = []
+            for value, ordinals in values.items():
+                if len(ordinals) >= dense_min:
+                    self.postings[field][value] = _to_bitmap(ordinals, self.size)
+                else:
+                    self.postings[field][value] = array('I', ordinals)
+                    for i in ordinals:
+                        codes[i] = len(names)
+                    names.append(value)
+            self.counts[field] = {value: len(ordinals) for value, ordinals in values.items()}
+            self.sparse_values[field] = names
+            self.sparse_codes[field] = codes
+            self.sparse_total[field] = sum(self.counts[field][value] for value in names)
+
+        # Ordinals sorted by price, for range filters
+        priced = sorted((float(p.get(PRICE_FIELD) or 0), i) for i, p in enumerate(products))
+        self.prices = array('d', (price for price, _ in priced))
+        self.price_order = array('I', (i for _, i in priced))
+        # Bitmaps of the cheapest k * price_step products, so a range only
+        # converts the ordinals between two steps
+        self.price_step = max(1, -(-self.size // 64))
+        self.price_prefix = [0]
+        for start in range(0, self.size, self.price_step):
+            chunk = self.price_order[start:start + self.price_step]
+            self.price_prefix.append(self.price_prefix[-1] | _to_bitmap(chunk, self.size))
+
+    def _bitmap(self, posting):
+        return posting if isinstance(posting, int) else _to_bitmap(posting, self.size)
+
+    def _field_mask(self, field, values):
+        """Products having any of values for field (OR within a field)."""
+        mask = 0
+        for value in values:
+            posting = self.postings[field].get(value)
+            if posting is not None:
+                mask |= self._bitmap(posting)
+        return mask
+
+    def _cheapest(self, k):
+        """Bitmap of the k cheapest products."""
+        step = k // self.price_step
+        start = step * self.price_step
+        return self.price_prefix[step] | _to_bitmap(self.price_order[start:k], self.size)
+
+    def _price_mask(self, min_price=None, max_price=None):
+        lo = 0 if min_price is None else bisect_left(self.prices, min_price)
+        hi = len(self.prices) if max_price is None else bisect_right(self.prices, max_price)
+        if hi <= lo:
+            return 0
+        return self._cheapest(hi) & ~self._cheapest(lo)
+
+    def _field_counts(self, field, mask):
+        """{value: products in mask} for one field."""
+        counts = {}
+        sparse = []
+        for value, posting in self.postings[field].items():
+            if isinstance(posting, int):
+                n = (posting & mask).bit_count()
+                if n:
+                    counts[value] = n
+            else:
+                sparse.append((value, posting))
+        if not sparse:
+            return counts
+
+        selected = mask.bit_count()
+        if selected < self.sparse_total[field]:
+            # Few products selected: tally their values
+            names = self.sparse_values[field]
+            codes = self.sparse_codes[field]
+            tally = {}
+            for i in self.ordinals(mask):
+                code = codes[i]
+                if code >= 0:
+                    tally[code] = tally.get(code, 0) + 1
+            counts.update((names[code], n) for code, n in tally.items())
+        else:
+            # Most products selected: test each sparse posting against the mask
+            mask_bytes = mask.to_bytes((self.size + 7) // 8, 'little')
+            for value, posting in sparse:
+                n = sum(mask_bytes[i >> 3] >> (i & 7) & 1 for i in posting)
+                if n:
+                    counts[value] = n
+        return counts
+
+    def search(self, filters, min_price=None, max_price=None):
+        """
+        filters: {field: [values]}. Returns (mask, facet_counts). Counts for a
+        field apply every filter except that field's own, so the other
+        values of a filtered facet still show how many products they'd add.
+        """
+        masks = {field: self._field_mask(field, values) for field, values in filters.items() if values}
+        base = self.all
+        if min_price is not None or max_price is not None:
+            base = self._price_mask(min_price, max_price)
+
+        mask = base
+        for field_mask in masks.values():
+            mask &= field_mask
+
+        if not masks and base == self.all:
+            return mask, self.counts
+
+        counts = {}
+        for field in FACET_FIELDS:
+            others = base
+            for other, field_mask in masks.items():
+                if other != field:
+                    others &= field_mask
+            counts[field] = self.counts[field] if others == self.all else self._field_counts(field, others)
+        return mask, counts
+
+    def ordinals(self, mask, offset=0, limit=None):
+        """Ordinals of the set bits of mask in catalog order, paged."""
+        found = []
+        skip = offset
+        for byte_index, byte in enumerate(mask.to_bytes((self.size + 7) // 8, 'little')):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    if skip:
+                        skip -= 1
+                    else:
+                        found.append(byte_index * 8 + bit)
+                        if limit is not None and len(found) >= limit:
+                            return found
+        return found
+
+class Catalog:
+    """Immutable snapshot of the product catalog plus its lookup indexes."""
+
+    def __init__(self, data):
+        self.data = data
+        self.products = data.get('products', [])
+
+        # SKU -> product dict
+        self.by_code = {p['code']: p for p in self.products if 'code' in p}
+
+        # Pre-serialized /api/products body, built once instead of per request
+        self.products_json = json.dumps({'products': self.products}).encode('utf-8')
+
+        # Facet postings and counts for filtered browsing
+        self.facets = FacetIndex(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, code):
+        return self.by_code.get(code)
+
+    def query(self, filters, min_price=None, max_price=None, offset=0, limit=100):
+        """Filtered page of products. Returns (total, products, facet_counts)."""
+        mask, counts = self.facets.search(filters, min_price, max_price)
+        page = [self.products[i] for i in self.facets.ordinals(mask, offset, limit)] if limit != 0 else []
+        return mask.bit_count(), page, counts
+
+class CountryTable:
+    """Country order and per-country metadata, shared by every RegionalPrices."""
+    __slots__ = ('codes', 'index', 'meta')
+
+    def __init__(self, countries):
+        # countries: {code: {'currency', 'symbol', 'shipping_cost'/'shipping'}}
+        self.codes = tuple(countries)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.meta = tuple(
+            (cfg['currency'], cfg['symbol'], cfg.get('shipping_cost', cfg.get('shipping')))
+            for cfg in countries.values()
+        )
+
+class RegionalPrices:
+    """
+    A product's regional_prices as one array of floats. get()/items() return
+    the same dicts as the JSON form, built on demand; write_catalog() expands
+    them one product at a time while saving.
+    """
+    __slots__ = ('table', 'prices')
+
+    def __init__(self, table, prices):
+        self.table = table
+        self.prices = array('d', prices)
+
+    def get(self, code, default=None):
+        i = self.table.index.get(code)
+        if i is None:
+            return default
+        currency, symbol, shipping = self.table.meta[i]
+        price = self.prices[i]
+        return {
+            'price': price,
+            'currency': currency,
+            'symbol': symbol,
+            'formatted': f"{symbol}{price}",
+            'shipping': shipping
+        }
+
+    def items(self):
+        for code in self.table.codes:
+            yield code, self.get(code)
+
+    def to_dict(self):
+        return dict(self.items())
+
+# Fields the GMC payloads and pricing need; everything else is dropped on load
+RECORD_FIELDS = (
+    'code', 'productname', 'produrltitle', 'brand', 'indepthdescn', 'briedfdescn',
+    'featured_img', 'additional_images', 'minprice', 'usd_price', 'regional_prices',
+    'gmc_active', 'weight', 'in_stock',
+)
+
+class ProductRecord:
+    """
+    Compact, read-only stand-in for a products.json entry. Supports the
+    dict-style get()/[] access the formatters use; fields missing from the
+    source stay unset, so get() falls back to its default like a dict would.
+    """
+    __slots__ = RECORD_FIELDS
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+_INTERNED = ('brand', 'featured_img', 'gmc_active')
+
+def make_record(product, tables):
+    """Build a ProductRecord from a product dict. tables caches shared CountryTables."""
+    record = ProductRecord()
+    for name in ('code', 'productname', 'produrltitle', 'indepthdescn', 'briedfdescn',
+                 'minprice', 'usd_price'):
+        if name in product:
+            setattr(record, name, product[name])
+    for name in _INTERNED:
+        value = product.get(name)
+        if isinstance(value, str):
+            # Brands and category images repeat across thousands of products
+            setattr(record, name, sys.intern(value))
+        elif name in product:
+            setattr(record, name, value)
+    if 'additional_images' in product:
+        record.additional_images = tuple(sys.intern(img) if isinstance(img, str) else img
+                                         for img in product['additional_images'])
+
+    regional = product.get('regional_prices')
+    if regional:
+        key = tuple(regional)
+        table = tables.get(key)
+        if table is None:
+            table = tables[key] = CountryTable(regional)
+        record.regional_prices = RegionalPrices(table, [rp.get('price', 0) for rp in regional.values()])
+
+    variants = product.get('variants') or []
+    record.in_stock = not variants or any((v.get('instock') or 0) > 0 for v in variants)
+    main = next((v for v in variants if v.get('mainentry')), variants[0] if variants else None)
+    if main and main.get('weight') is not None:
+        record.weight = main['weight']
+    return record
+
+def load_records(path=CATALOG_FILE):
+    """
+    Load products.json as a list of ProductRecord. Raw dicts are released as
+    they are converted, so peak memory stays near a single parsed copy.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        products = json.load(f).get('products', [])
+
+    tables = {}
+    records = []
+    products.reverse()
+    while products:
+        records.append(make_record(products.pop(), tables))
+    return records
+
+def product_availability(product):
+    """'in stock' unless the product has variants and none of them has stock."""
+    if isinstance(product, ProductRecord):
+        return 'in stock' if product.in_stock else 'out of stock'
+    variants = product.get('variants') or []
+    if variants and not any((v.get('instock') or 0) > 0 for v in variants):
+        return 'out of stock'
+    return 'in stock'
+
+def landing_page(slug, country):
+    """GMC link of a listing: its country's page from static_pages.py, priced in the listing's currency."""
+    return f"{STORE_URL}/products/{slug}/{country}.html"
+
+def read_catalog(path=CATALOG_FILE):
+    """Load and index the catalog. Raises if the file can't be read or parsed."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return Catalog(json.load(f))
+
+def load_catalog(path=CATALOG_FILE):
+    """Load and index the catalog. Returns an empty catalog if the file can't be read."""
+    try:
+        return read_catalog(path)
+    except Exception as e:
+        print(f"[CATALOG] Error reading {path}: {e}")
+        return Catalog({'products': []})
+
+def _encode(obj):
+    if isinstance(obj, RegionalPrices):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def write_catalog(data, path=CATALOG_FILE):
+    """
+    Atomically replace the catalog file: write a temp file in the same
+    directory, fsync it, then rename over the original.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix='.products.', suffix='.tmp', dir=directory)
+    try:
+        # mkstemp creates the file 0600; keep the catalog readable as before
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=_encode)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Persist the rename itself (not supported on Windows)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class CatalogStore:
+    """
+    Holds the current Catalog snapshot and hot-swaps it when the file changes.
+    Readers never wait: a change is picked up by a background reload while
+    the previous snapshot keeps serving, and an unreadable file is ignored.
+    """
+
+    def __init__(self, path=CATALOG_FILE, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = Catalog({'products': []})
+        self._signature = None
+        self._next_check = 0
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        """Load synchronously (startup). Returns the snapshot."""
+        signature = self._stat_signature()
+        self._snapshot = load_catalog(self.path)
+        self._signature = signature
+        return self._snapshot
+
+    def _reload(self, signature):
+        try:
+            snapshot = read_catalog(self.path)
+            self._snapshot = snapshot
+            self._signature = signature
+            print(f"[CATALOG] Reloaded {self.path}: {len(snapshot)} products")
+        except Exception as e:
+            print(f"[CATALOG] Keeping previous snapshot, reload failed: {e}")
+        finally:
+            self._reloading = False
+
+    def current(self):
+        """The latest complete snapshot. Checks the file at most every check_interval."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            signature = self._stat_signature()
+            if signature is not None and signature != self._signature:
+                with self._lock:
+                    if not self._reloading:
+                        self._reloading = True
+                        threading.Thread(target=self._reload, args=(signature,), daemon=True).start()
+        return self._snapshot
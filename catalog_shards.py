@@ -0,0 +1,130 @@
+"""
+Catalog Shards - Static catalog pages and search index for the website
+When the API is unreachable, website/index.html falls back to these files
+instead of downloading every product:
+
+- website/catalog/manifest.json: tiny pointer to the current build
+  (total, page size, page count, build directory)
+- website/catalog/{build}/page-00000.json ...: fixed-size shards of grid
+  cards (code, productname, produrltitle, minprice), in catalog order
+- website/catalog/{build}/search.json: sorted token list with
+  delta-encoded postings of product ordinals (ordinal // page_size = shard)
+
+Each build goes to its own directory and the manifest is replaced last, so
+a browser never mixes shards of two builds. The previous build is kept for
+pages still open on it; older ones are removed.
+"""
+import sys
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+SHARDS_DIR = os.path.join('website', 'catalog')
+PAGE_SIZE = 500
+
+# Fields the catalog grid shows
+CARD_FIELDS = ('code', 'productname', 'produrltitle', 'minprice')
+
+# Keep in sync with tokenize() in website/index.html
+_TOKEN = re.compile(r'[^\W_]+')
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+def build_cards(products):
+    return [{field: p.get(field) for field in CARD_FIELDS} for p in products]
+
+def build_search_index(cards):
+    """{'tokens': [sorted tokens], 'postings': [[first ordinal, delta, delta, ...], ...]}"""
+    postings = {}
+    for ordinal, card in enumerate(cards):
+        for token in set(tokenize(card['productname'] or '') + tokenize(card['code'] or '')):
+            postings.setdefault(token, []).append(ordinal)
+
+    tokens = sorted(postings)
+    encoded = []
+    for token in tokens:
+        ordinals = postings[token]
+        encoded.append([ordinals[0]] + [b - a for a, b in zip(ordinals, ordinals[1:])])
+    return {'tokens': tokens, 'postings': encoded}
+
+def _dump(obj, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+
+def read_manifest(out_dir=SHARDS_DIR):
+    try:
+        with open(os.path.join(out_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def build_shards(products_path='products.json', out_dir=SHARDS_DIR, page_size=PAGE_SIZE, force=False):
+    """Write a new build if the cards changed. Returns (manifest, rebuilt)."""
+    with open(products_path, 'r', encoding='utf-8') as f:
+        cards = build_cards(json.load(f).get('products', []))
+
+    blob = json.dumps([page_size, cards], separators=(',', ':')).encode('utf-8')
+    build = hashlib.sha1(blob).hexdigest()[:12]
+    previous = read_manifest(out_dir)
+    if not force and previous.get('build') == build and os.path.isdir(os.path.join(out_dir, build)):
+        return previous, False
+
+    os.makedirs(out_dir, exist_ok=True)
+    build_dir = os.path.join(out_dir, build)
+    tmp_dir = tempfile.mkdtemp(prefix='.build.', dir=out_dir)
+    try:
+        pages = 0
+        for start in range(0, len(cards), page_size):
+            _dump(cards[start:start + page_size], os.path.join(tmp_dir, f"page-{pages:05d}.json"))
+            pages += 1
+        _dump(build_search_index(cards), os.path.join(tmp_dir, 'search.json'))
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.replace(tmp_dir, build_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    manifest = {
+        'build': build,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total': len(cards),
+        'page_size': page_size,
+        'pages': pages,
+        'search': 'search.json',
+    }
+    tmp_path = os.path.join(out_dir, 'manifest.json.tmp')
+    _dump(manifest, tmp_path)
+    os.replace(tmp_path, os.path.join(out_dir, 'manifest.json'))
+
+    # Keep the current and the previous build only
+    keep = {build, previous.get('build')}
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path) and name not in keep and not name.startswith('.'):
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest, True
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Split the catalog into static shards with a search index')
+    parser.add_argument('--out', default=SHARDS_DIR, help='Output directory')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='Products per shard')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if nothing changed')
+    args = parser.parse_args()
+
+    start = time.time()
+    manifest, rebuilt = build_shards(out_dir=args.out, page_size=args.page_size, force=args.force)
+    if not rebuilt:
+        print(f"[SHARDS] Build {manifest['build']} is up to date ({manifest['total']} products)")
+        return
+    print(f"✅ Build {manifest['build']}: {manifest['total']} products in {manifest['pages']} shards "
+          f"of {manifest['page_size']} ({time.time() - start:.2f}s)")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,123 @@
+"""
+Credentials Provider - One service-account credential per process
+Every entry point gets its Google credentials from here, so the key file is
+parsed once and all clients in the process share one access token.
+
+- Tokens are refreshed proactively, REFRESH_MARGIN seconds before expiry,
+  with one refresh at a time across threads
+- Optional on-disk token cache (GMC_TOKEN_CACHE=path, or disk_cache=True)
+  lets worker processes and back-to-back job runs reuse a live token
+  instead of each doing their own token exchange
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+KEY_FILE = 'service_account.json'
+SCOPES = ('https://www.googleapis.com/auth/content',)
+DEFAULT_TOKEN_CACHE = '.gmc_token_cache.json'
+
+# Refresh this long before the token expires
+REFRESH_MARGIN = 300
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_credentials = {}
+_cache_paths = {}
+
+def _cache_path(disk_cache):
+    if disk_cache is None:
+        return os.getenv('GMC_TOKEN_CACHE')
+    if disk_cache is True:
+        return os.getenv('GMC_TOKEN_CACHE') or DEFAULT_TOKEN_CACHE
+    return disk_cache or None
+
+def _cache_key(creds):
+    blob = f"{creds.service_account_email}|{' '.join(sorted(creds.scopes or ()))}"
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+def _seconds_left(creds):
+    if not creds.token or not creds.expiry:
+        return 0
+    # google-auth keeps expiry as naive UTC
+    return (creds.expiry - datetime.utcnow()).total_seconds()
+
+def _load_token(creds, path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(_cache_key(creds))
+    except (OSError, ValueError):
+        return
+    if not entry:
+        return
+    expiry = datetime.utcfromtimestamp(entry['expiry'])
+    if (expiry - datetime.utcnow()).total_seconds() > REFRESH_MARGIN:
+        creds.token = entry['token']
+        creds.expiry = expiry
+
+def _save_token(creds, path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries[_cache_key(creds)] = {
+        'token': creds.token,
+        'expiry': (creds.expiry - datetime(1970, 1, 1)).total_seconds(),
+    }
+    # Owner-only, written atomically so concurrent readers never see half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, path)
+
+def get_credentials(key_file=KEY_FILE, scopes=SCOPES, disk_cache=None):
+    """
+    Shared credentials for key_file. Falls back to the GOOGLE_CREDENTIALS
+    env var (the key JSON) when the file does not exist.
+    """
+    key = (os.path.abspath(key_file), tuple(scopes))
+    path = _cache_path(disk_cache)
+    creds = _credentials.get(key)
+    if creds is not None and (not path or id(creds) in _cache_paths):
+        return creds
+
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is not None and path and id(creds) not in _cache_paths:
+            # Already in use without a disk cache: start persisting its token
+            _cache_paths[id(creds)] = path
+        if creds is None:
+            from google.oauth2 import service_account
+            if os.path.exists(key_file):
+                creds = service_account.Credentials.from_service_account_file(key_file, scopes=list(scopes))
+            elif os.getenv('GOOGLE_CREDENTIALS'):
+                creds = service_account.Credentials.from_service_account_info(
+                    json.loads(os.getenv('GOOGLE_CREDENTIALS')), scopes=list(scopes)
+                )
+            else:
+                raise FileNotFoundError(f"Missing Key File: {key_file}")
+
+            if path:
+                _load_token(creds, path)
+                _cache_paths[id(creds)] = path
+            _credentials[key] = creds
+    return creds
+
+def ensure_fresh(creds):
+    """Refresh the token if it is missing or within REFRESH_MARGIN of expiry."""
+    if _seconds_left(creds) > REFRESH_MARGIN:
+        return creds
+
+    with _refresh_lock:
+        if _seconds_left(creds) > REFRESH_MARGIN:
+            return creds
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        path = _cache_paths.get(id(creds))
+        if path:
+            _save_token(creds, path)
+    return creds
@@ -0,0 +1,96 @@
+"""
+Data Source Registry - Country table with verified data source IDs
+Merges the enabled countries of country_config.json with the account's
+data sources (as listed by fetch_data_sources.py), once per process.
+
+- data_sources.json is the cache; it is re-listed via API only when older
+  than the TTL (GMC_DATA_SOURCES_TTL seconds, default 24h), so a normal push
+  starts without any extra API round trip
+- The listed data source for a feed label wins over a hand-maintained
+  data_source_id in country_config.json
+- Enabled countries whose configured ID is not a data source of the account
+  are reported as errors before anything is pushed
+"""
+import json
+import os
+import threading
+import time
+from fetch_data_sources import DATA_SOURCES_FILE, list_data_sources, save_data_sources
+
+TTL = float(os.getenv('GMC_DATA_SOURCES_TTL', 24 * 3600))
+
+_lock = threading.Lock()
+_tables = {}
+
+def load_data_sources(merchant_id, path=DATA_SOURCES_FILE, max_age=TTL, key_file=None):
+    """Cached data sources; re-listed via API (and rewritten) when missing or stale."""
+    try:
+        if time.time() - os.path.getmtime(path) < max_age:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    print(f"[DATA SOURCES] Cache missing or older than {max_age:.0f}s, listing via API...")
+    try:
+        data_sources = list_data_sources(merchant_id, key_file)
+        save_data_sources(data_sources, path)
+        return data_sources
+    except Exception as e:
+        print(f"[DATA SOURCES] Listing failed ({e}), using stale cache")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+def merge_country_table(config, data_sources):
+    """
+    Fill data_source_id of enabled countries from the listed data sources.
+    Returns (countries, problems); countries only contains pushable entries.
+    """
+    by_label = {key: ds['id'] for key, ds in data_sources.items() if ds.get('feed_label')}
+    known_ids = {ds['id'] for ds in data_sources.values()}
+
+    countries = {}
+    problems = []
+    for code, cfg in config.get('countries', {}).items():
+        if not cfg.get('enabled', False):
+            continue
+        configured = cfg.get('data_source_id')
+        listed = by_label.get(code)
+
+        if listed:
+            if configured and str(configured) != listed:
+                print(f"[DATA SOURCES] {code}: config has {configured}, using listed {listed}")
+            countries[code] = dict(cfg, data_source_id=listed)
+        elif not configured:
+            problems.append(f"{code}: enabled but no data source found")
+        elif known_ids and str(configured) not in known_ids:
+            problems.append(f"{code}: data source {configured} does not exist in this account")
+        else:
+            countries[code] = dict(cfg)
+    return countries, problems
+
+def get_country_table(merchant_id, config, path=DATA_SOURCES_FILE, max_age=TTL, key_file=None):
+    """
+    Merged, validated country table for merchant_id; built once per process.
+    Each account needs its own path (see merchants.py).
+    """
+    key = (str(merchant_id), path)
+    with _lock:
+        if key not in _tables:
+            _tables[key] = merge_country_table(config, load_data_sources(merchant_id, path, max_age, key_file))
+        return _tables[key]
+
+def get_data_source(merchant_id, feed_label, config=None, config_path='country_config.json',
+                    path=None, key_file=None):
+    """Full data source name for a feed label, or None."""
+    if config is None:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    countries, _ = get_country_table(merchant_id, config, path or DATA_SOURCES_FILE, key_file=key_file)
+    cfg = countries.get(feed_label)
+    if not cfg:
+        return None
+    return f"accounts/{merchant_id}/dataSources/{cfg['data_source_id']}"
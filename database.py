@@ -1,7 +1,14 @@
 import sqlite3
+import time
 
 DB_NAME = "gmc_state.db"
 
+def connect():
+    """Open a connection in WAL mode so readers don't block the writer."""
+    conn = sqlite3.connect(DB_NAME, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
 def init_db():
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
@@ -12,6 +19,105 @@ def init_db():
                   last_inr_price REAL DEFAULT 0, 
                   last_usd_price REAL DEFAULT 0,
                   last_aud_price REAL DEFAULT 0)''')
+    # Columns added for the price/stock fast lane (see price_stock_sync.py)
+    existing = {row[1] for row in c.execute('PRAGMA table_info(product_flags)')}
+    for column in ('last_availability', 'last_price_hash', 'last_content_hash'):
+        if column not in existing:
+            c.execute(f"ALTER TABLE product_flags ADD COLUMN {column} TEXT DEFAULT ''")
+    # Local mirror of the live Merchant Center inventory (see inventory_mirror.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS gmc_mirror
+                 (merchant_id TEXT,
+                  offer_id TEXT,
+                  feed_label TEXT,
+                  source TEXT,
+                  product_id TEXT,
+                  data_source TEXT,
+                  fingerprint TEXT,
+                  payload TEXT,
+                  updated_at REAL,
+                  PRIMARY KEY (merchant_id, offer_id, feed_label))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS gmc_mirror_sync
+                 (merchant_id TEXT,
+                  source TEXT,
+                  refreshed_at REAL,
+                  item_count INTEGER,
+                  PRIMARY KEY (merchant_id, source))''')
+    # Checkpoint journal for resumable push runs (see push_journal.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS push_runs
+                 (run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  merchant_id TEXT,
+                  started_at REAL,
+                  finished_at REAL,
+                  status TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS push_journal
+                 (run_id INTEGER,
+                  offer_id TEXT,
+                  payload_hash TEXT,
+                  status TEXT,
+                  error TEXT,
+                  updated_at REAL,
+                  PRIMARY KEY (run_id, offer_id))''')
+    # Last exported payload per listing, for delta feeds (see feed_export.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS feed_export_state
+                 (feed_label TEXT,
+                  offer_id TEXT,
+                  payload_hash TEXT,
+                  exported_at REAL,
+                  PRIMARY KEY (feed_label, offer_id))''')
+    # Last rendered signature per product page (see static_pages.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS static_page_state
+                 (code TEXT PRIMARY KEY,
+                  slug TEXT,
+                  signature TEXT,
+                  rendered_at REAL)''')
+    # Name and image hashes per product that already has its images (see assign_product_images.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS image_assignment_state
+                 (code TEXT PRIMARY KEY,
+                  name_hash TEXT,
+                  category TEXT,
+                  batch INTEGER,
+                  assigned_at REAL)''')
+    existing = {row[1] for row in c.execute('PRAGMA table_info(image_assignment_state)')}
+    if 'images_hash' not in existing:
+        c.execute("ALTER TABLE image_assignment_state ADD COLUMN images_hash TEXT DEFAULT ''")
+    # Last check result per image URL (see image_validator.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS image_url_cache
+                 (url TEXT PRIMARY KEY,
+                  ok INTEGER,
+                  status INTEGER,
+                  checked_at REAL)''')
+    # On-demand sync requests from POST /api/sync (see sync_queue.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_tickets
+                 (ticket_id TEXT PRIMARY KEY,
+                  status TEXT,
+                  skus TEXT,
+                  results TEXT,
+                  created_at REAL,
+                  updated_at REAL)''')
+    # pid of the server process holding an unfinished ticket's SKUs in its queue
+    existing = {row[1] for row in c.execute('PRAGMA table_info(sync_tickets)')}
+    if 'owner' not in existing:
+        c.execute("ALTER TABLE sync_tickets ADD COLUMN owner TEXT")
+    # Last pushed state per SKU for each additional account (see multi_merchant_sync.py);
+    # the default account keeps using product_flags
+    c.execute('''CREATE TABLE IF NOT EXISTS merchant_push_state
+                 (merchant_id TEXT,
+                  sku TEXT,
+                  last_inr_price REAL,
+                  last_usd_price REAL,
+                  last_aud_price REAL,
+                  last_availability TEXT,
+                  last_price_hash TEXT,
+                  last_content_hash TEXT,
+                  PRIMARY KEY (merchant_id, sku))''')
+    # Listing settings (currency, shipping, data source...) each account's
+    # countries were last fully pushed with (see multi_merchant_sync.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS merchant_country_state
+                 (merchant_id TEXT,
+                  country TEXT,
+                  listing_hash TEXT,
+                  updated_at REAL,
+                  PRIMARY KEY (merchant_id, country))''')
     conn.commit()
     conn.close()
 
@@ -29,6 +135,97 @@ def set_flag(sku, enabled=True, inr=0, usd=0, aud=0):
     conn.commit()
     conn.close()
 
+def set_push_state(rows, merchant_id=None):
+    """
+    Bulk-record what was last pushed per SKU.
+    rows: (sku, inr, usd, aud, availability, price_hash, content_hash)
+    merchant_id: namespace of an additional account (None = default account)
+    """
+    conn = connect()
+    if merchant_id is not None:
+        conn.executemany('''INSERT OR REPLACE INTO merchant_push_state
+                              (merchant_id, sku, last_inr_price, last_usd_price, last_aud_price,
+                               last_availability, last_price_hash, last_content_hash)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                         [(str(merchant_id),) + tuple(row) for row in rows])
+        conn.commit()
+        conn.close()
+        return
+    # New SKUs start enabled; an existing row keeps its enabled flag (set_flag)
+    conn.executemany('''INSERT INTO product_flags
+                          (sku, enabled, last_inr_price, last_usd_price, last_aud_price,
+                           last_availability, last_price_hash, last_content_hash)
+                          VALUES (?, 1, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT(sku) DO UPDATE SET
+                          enabled=COALESCE(product_flags.enabled, excluded.enabled),
+                          last_inr_price=excluded.last_inr_price,
+                          last_usd_price=excluded.last_usd_price,
+                          last_aud_price=excluded.last_aud_price,
+                          last_availability=excluded.last_availability,
+                          last_price_hash=excluded.last_price_hash,
+                          last_content_hash=excluded.last_content_hash''', rows)
+    conn.commit()
+    conn.close()
+
+def clear_push_state(skus, merchant_id=None):
+    """Forget SKUs whose listings were deleted, so they get a full push if they come back."""
+    conn = connect()
+    if merchant_id is not None:
+        conn.executemany('DELETE FROM merchant_push_state WHERE merchant_id=? AND sku=?',
+                         [(str(merchant_id), sku) for sku in skus])
+    else:
+        # Keep the row: its enabled flag (set_flag) outlives the listings
+        conn.executemany('''UPDATE product_flags SET
+                              last_inr_price=NULL, last_usd_price=NULL, last_aud_price=NULL,
+                              last_availability=NULL, last_price_hash=NULL, last_content_hash=NULL
+                              WHERE sku=?''', [(sku,) for sku in skus])
+    conn.commit()
+    conn.close()
+
+def get_push_state(merchant_id=None):
+    """Returns {sku: (inr, usd, aud, availability, price_hash, content_hash)}"""
+    conn = connect()
+    c = conn.cursor()
+    if merchant_id is not None:
+        c.execute('''SELECT sku, last_inr_price, last_usd_price, last_aud_price,
+                            last_availability, last_price_hash, last_content_hash
+                     FROM merchant_push_state WHERE merchant_id=?''', (str(merchant_id),))
+    else:
+        # Rows without a content hash were never pushed (set_flag only) or were cleared
+        c.execute("""SELECT sku, last_inr_price, last_usd_price, last_aud_price,
+                            last_availability, last_price_hash, last_content_hash
+                     FROM product_flags WHERE COALESCE(last_content_hash, '') != ''""")
+    rows = {row[0]: row[1:] for row in c.fetchall()}
+    conn.close()
+    return rows
+
+def set_country_state(merchant_id, listings):
+    """Record the listing settings each country was fully pushed with. listings: {country: hash}"""
+    conn = connect()
+    now = time.time()
+    conn.executemany('''INSERT OR REPLACE INTO merchant_country_state
+                          (merchant_id, country, listing_hash, updated_at) VALUES (?, ?, ?, ?)''',
+                     [(str(merchant_id), country, listing_hash, now) for country, listing_hash in listings.items()])
+    conn.commit()
+    conn.close()
+
+def get_country_state(merchant_id):
+    """Returns {country: listing_hash} of the account's last full push per country"""
+    conn = connect()
+    try:
+        return dict(conn.execute('SELECT country, listing_hash FROM merchant_country_state WHERE merchant_id=?',
+                                 (str(merchant_id),)))
+    finally:
+        conn.close()
+
+def get_disabled_skus():
+    """SKUs switched off with set_flag(enabled=False); the fast lane leaves them alone."""
+    conn = connect()
+    try:
+        return {row[0] for row in conn.execute('SELECT sku FROM product_flags WHERE enabled=0')}
+    finally:
+        conn.close()
+
 def get_enabled_products():
     """Returns list of SKUs that should be synced"""
     conn = sqlite3.connect(DB_NAME)
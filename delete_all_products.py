@@ -8,6 +8,7 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from gmc_manager import GMCManager
 
@@ -48,7 +49,7 @@ def main():
     print("Starting deletion...")
     print("-" * 60)
     
-    for i, product in enumerate(products, 1):
+    def delete_both(product):
         sku = product['code']
         
         # We constructed offerId as SKU-Country in the push script
@@ -61,18 +62,23 @@ def main():
         # 2. Delete AU Version
         offer_id_au = f"{sku}-AU"
         success_au, msg_au = gmc.delete_product(offer_id_au, 'AU')
-
-        status_str = []
-        if success_us: status_str.append("US: Deleted")
-        else: status_str.append(f"US: {msg_us[:20]}")
-        
-        if success_au: status_str.append("AU: Deleted")
-        else: status_str.append(f"AU: {msg_au[:20]}")
         
-        print(f"[{i:02d}/{len(products)}] {sku} -> " + " | ".join(status_str))
-        
-        if success_us or success_au:
-            success_count += 1
+        return sku, success_us, msg_us, success_au, msg_au
+    
+    # GMCManager is thread-safe: workers share it, each on its own connection
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for i, (sku, success_us, msg_us, success_au, msg_au) in enumerate(pool.map(delete_both, products), 1):
+            status_str = []
+            if success_us: status_str.append("US: Deleted")
+            else: status_str.append(f"US: {msg_us[:20]}")
+            
+            if success_au: status_str.append("AU: Deleted")
+            else: status_str.append(f"AU: {msg_au[:20]}")
+            
+            print(f"[{i:02d}/{len(products)}] {sku} -> " + " | ".join(status_str))
+            
+            if success_us or success_au:
+                success_count += 1
             
     print("\n" + "=" * 60)
     print("DELETION COMPLETE!")
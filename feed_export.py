@@ -0,0 +1,201 @@
+"""
+Feed Export - Bulk product feed files for Merchant Center
+Writes one gzip-compressed TSV or XML (RSS 2.0) feed per enabled country,
+for scheduled fetches instead of one API call per listing.
+
+- Listings are formatted with GMCManager.format_catalog_product, the same
+  payload the Content API push paths send
+- Rows are streamed into the gzip file one at a time (constant memory), then
+  the finished file replaces the previous one atomically
+- --delta writes only listings whose payload changed since the last export
+  (tracked in the feed_export_state table of gmc_state.db). Feeds cannot
+  delete items; removals still need a full feed or reconcile.py
+"""
+import sys
+import gzip
+import json
+import os
+import time
+from xml.sax.saxutils import escape
+import database
+from catalog import load_records
+from gmc_manager import GMCManager
+from push_journal import payload_hash
+from reconcile import get_sync_countries, is_active
+from update_global_prices import load_country_config
+
+FEED_DIR = 'feeds'
+
+TSV_COLUMNS = (
+    'id', 'title', 'description', 'link', 'image_link', 'additional_image_link',
+    'availability', 'condition', 'brand', 'price', 'shipping', 'identifier_exists',
+)
+
+def feed_attributes(body):
+    """
+    Flatten a Content API product body into feed attribute strings. shipping
+    stays a list of {country, service, price} for the writers to lay out.
+    """
+    price = body['price']
+    return {
+        'id': body['offerId'],
+        'title': body['title'],
+        'description': body['description'],
+        'link': body['link'],
+        'image_link': body['imageLink'],
+        'additional_image_link': ','.join(body.get('additionalImageLinks', [])),
+        'availability': body['availability'],
+        'condition': body['condition'],
+        'brand': body['brand'],
+        'price': f"{price['value']} {price['currency']}",
+        'shipping': [{
+            'country': s['country'],
+            'service': s['service'],
+            'price': f"{s['price']['value']} {s['price']['currency']}",
+        } for s in body.get('shipping', [])],
+        'identifier_exists': 'yes' if body.get('identifierExists') else 'no',
+    }
+
+def _tsv_value(value):
+    # Tabs and newlines would break the row structure
+    return ' '.join(str(value).split())
+
+def _tsv_shipping(shipping):
+    # country:region:service:price, one group per comma
+    return ','.join(f"{s['country']}::{s['service']}:{s['price']}" for s in shipping)
+
+class TSVWriter:
+    extension = 'tsv'
+
+    def __init__(self, f):
+        self.f = f
+        f.write('\t'.join(TSV_COLUMNS) + '\n')
+
+    def write(self, attrs):
+        self.f.write('\t'.join(_tsv_value(_tsv_shipping(attrs[col]) if col == 'shipping' else attrs[col])
+                                for col in TSV_COLUMNS) + '\n')
+
+    def close(self):
+        pass
+
+class XMLWriter:
+    extension = 'xml'
+
+    def __init__(self, f):
+        self.f = f
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n')
+
+    def write(self, attrs):
+        parts = ['<item>']
+        for col in TSV_COLUMNS:
+            if col == 'additional_image_link':
+                for link in filter(None, attrs[col].split(',')):
+                    parts.append(f'<g:{col}>{escape(link)}</g:{col}>')
+            elif col == 'shipping':
+                # The XML feed spec nests each shipping group in sub-elements
+                for s in attrs[col]:
+                    parts.append('<g:shipping>' + ''.join(
+                        f'<g:{key}>{escape(s[key])}</g:{key}>' for key in ('country', 'service', 'price')
+                    ) + '</g:shipping>')
+            else:
+                parts.append(f'<g:{col}>{escape(str(attrs[col]))}</g:{col}>')
+        parts.append('</item>\n')
+        self.f.write(''.join(parts))
+
+    def close(self):
+        self.f.write('</channel>\n</rss>\n')
+
+WRITERS = {'tsv': TSVWriter, 'xml': XMLWriter}
+
+def export_country(products, country, country_cfg, fmt='tsv', delta=False, out_dir=FEED_DIR, conn=None):
+    """
+    Stream one country's feed to {out_dir}/{country}[.delta].{fmt}.gz.
+    conn: gmc_state.db connection for the export state (opened here if None).
+    Returns (path, items_written).
+    """
+    if conn is None:
+        database.init_db()
+        conn = database.connect()
+        try:
+            return export_country(products, country, country_cfg, fmt, delta, out_dir, conn)
+        finally:
+            conn.close()
+
+    writer_cls = WRITERS[fmt]
+    suffix = '.delta' if delta else ''
+    path = os.path.join(out_dir, f"{country}{suffix}.{writer_cls.extension}.gz")
+    tmp_path = path + '.tmp'
+
+    previous = {}
+    if delta:
+        previous = dict(conn.execute('SELECT offer_id, payload_hash FROM feed_export_state WHERE feed_label=?',
+                                     (country,)))
+
+    def save_state(rows):
+        conn.executemany('''INSERT OR REPLACE INTO feed_export_state
+                            (feed_label, offer_id, payload_hash, exported_at) VALUES (?, ?, ?, ?)''', rows)
+
+    written = 0
+    pending = []
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+            writer = writer_cls(f)
+            for product in products:
+                if not is_active(product):
+                    continue
+                body = GMCManager.format_catalog_product(product, country, country_cfg)
+                digest = payload_hash(json.dumps(body, sort_keys=True, separators=(',', ':')))
+                if delta and previous.get(body['offerId']) == digest:
+                    continue
+                writer.write(feed_attributes(body))
+                written += 1
+                pending.append((country, body['offerId'], digest, time.time()))
+                if len(pending) >= 1000:
+                    save_state(pending)
+                    pending = []
+            writer.close()
+        save_state(pending)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Keep the recorded state in line with the feed file that is in place
+        conn.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    conn.commit()
+    return path, written
+
+def export_feeds(fmt='tsv', delta=False, out_dir=FEED_DIR, products_path='products.json'):
+    """Export feeds for every enabled country. Returns {country: (path, items)}."""
+    countries = get_sync_countries(load_country_config())
+    products = load_records(products_path)
+
+    os.makedirs(out_dir, exist_ok=True)
+    database.init_db()
+    conn = database.connect()
+    try:
+        return {code: export_country(products, code, cfg, fmt, delta, out_dir, conn)
+                for code, cfg in countries.items()}
+    finally:
+        conn.close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Export gzip product feeds per enabled country')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='tsv')
+    parser.add_argument('--delta', action='store_true', help='Only listings changed since the last export')
+    parser.add_argument('--out', default=FEED_DIR, help='Output directory')
+    args = parser.parse_args()
+
+    start = time.time()
+    results = export_feeds(args.format, args.delta, args.out)
+    for code, (path, count) in results.items():
+        print(f"  {code}: {count} items -> {path}")
+    print(f"\n✅ Exported {sum(c for _, c in results.values())} listings in {time.time() - start:.2f}s")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
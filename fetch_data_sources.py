@@ -3,70 +3,80 @@ Fetch Data Sources - Automatically gets all Data Source IDs from Merchant Center
 No manual clicking needed!
 """
 import os
+import json
 from dotenv import load_dotenv
-from google.oauth2 import service_account
-from google.shopping.merchant_datasources_v1beta import DataSourcesServiceClient
+from credentials_provider import get_credentials
 
 load_dotenv()
 
+DATA_SOURCES_FILE = 'data_sources.json'
+
+def list_data_sources(merchant_id, key_file=None):
+    """
+    List the account's data sources via API.
+    Returns {feed_label (or ID if none): {'id', 'name', 'display_name', 'feed_label'}}
+    """
+    from google.shopping.merchant_datasources_v1beta import DataSourcesServiceClient
+
+    # Create client
+    creds = get_credentials(key_file) if key_file else get_credentials()
+    client = DataSourcesServiceClient(credentials=creds)
+
+    data_sources = {}
+    request = {"parent": f"accounts/{merchant_id}"}
+
+    for ds in client.list_data_sources(request=request):
+        # Parse the data source name to get ID
+        # Format: accounts/{account_id}/dataSources/{datasource_id}
+        ds_id = ds.name.split('/')[-1]
+
+        # Get feed label (country) from primary product data source
+        feed_label = None
+        if hasattr(ds, 'primary_product_data_source') and ds.primary_product_data_source:
+            feed_label = ds.primary_product_data_source.feed_label
+
+        data_sources[feed_label or ds_id] = {
+            'id': ds_id,
+            'name': ds.name,
+            'display_name': ds.display_name if hasattr(ds, 'display_name') else 'N/A',
+            'feed_label': feed_label
+        }
+
+    return data_sources
+
+def save_data_sources(data_sources, path=DATA_SOURCES_FILE):
+    """Write data sources to disk atomically (readers never see a partial file)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data_sources, f, indent=2)
+    os.replace(tmp_path, path)
+
 def get_all_data_sources():
     """Fetch all data sources from Merchant Center via API."""
-    
+
     merchant_id = os.getenv('GMC_MERCHANT_ID')
-    account = f"accounts/{merchant_id}"
-    
-    # Authenticate
-    credentials = service_account.Credentials.from_service_account_file(
-        'service_account.json',
-        scopes=['https://www.googleapis.com/auth/content']
-    )
-    
-    # Create client
-    client = DataSourcesServiceClient(credentials=credentials)
-    
+
     print(f"Fetching data sources for Merchant ID: {merchant_id}")
     print("=" * 60)
-    
-    # List all data sources
-    data_sources = {}
-    
+
     try:
-        request = {"parent": account}
-        
-        for ds in client.list_data_sources(request=request):
-            # Parse the data source name to get ID
-            # Format: accounts/{account_id}/dataSources/{datasource_id}
-            ds_id = ds.name.split('/')[-1]
-            
-            # Get feed label (country) from primary product data source
-            feed_label = None
-            if hasattr(ds, 'primary_product_data_source') and ds.primary_product_data_source:
-                feed_label = ds.primary_product_data_source.feed_label
-            
-            data_sources[feed_label or ds_id] = {
-                'id': ds_id,
-                'name': ds.name,
-                'display_name': ds.display_name if hasattr(ds, 'display_name') else 'N/A',
-                'feed_label': feed_label
-            }
-            
-            print(f"  [{feed_label or 'N/A'}] ID: {ds_id}")
-            print(f"       Name: {ds.display_name if hasattr(ds, 'display_name') else ds.name}")
-            print()
-            
+        data_sources = list_data_sources(merchant_id)
     except Exception as e:
         print(f"[ERROR] {e}")
         return None
-    
+
+    for key, ds in data_sources.items():
+        print(f"  [{ds['feed_label'] or 'N/A'}] ID: {ds['id']}")
+        print(f"       Name: {ds['display_name']}")
+        print()
+
     print("=" * 60)
     print(f"Total data sources found: {len(data_sources)}")
-    
+
     # Save to config file
-    import json
-    with open('data_sources.json', 'w') as f:
-        json.dump(data_sources, f, indent=2)
-    print(f"\n✅ Saved to data_sources.json")
-    
+    save_data_sources(data_sources)
+    print(f"\n✅ Saved to {DATA_SOURCES_FILE}")
+
     return data_sources
 
 if __name__ == '__main__':
@@ -1,22 +1,149 @@
 import os
 import json
 import re
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from googleapiclient.errors import HttpError
+from catalog import landing_page, product_availability
+from credentials_provider import KEY_FILE, get_credentials, ensure_fresh
+
+# custombatch chunking (see GMCManager._custombatch)
+CUSTOMBATCH_MAX_BYTES = int(os.getenv('GMC_BATCH_MAX_BYTES', 16 * 1024 * 1024))
+CUSTOMBATCH_TARGET_SECONDS = float(os.getenv('GMC_BATCH_TARGET_SECONDS', 30))
+CUSTOMBATCH_WORKERS = int(os.getenv('GMC_BATCH_WORKERS', 4))
+# Transient failures: retries of the same chunk, first backoff in seconds (doubles)
+CUSTOMBATCH_RETRIES = int(os.getenv('GMC_BATCH_RETRIES', 3))
+CUSTOMBATCH_BACKOFF = float(os.getenv('GMC_BATCH_BACKOFF', 2.0))
+
+class BatchSizer:
+    """Entry limit for the next custombatch chunk, adapted to how long calls take."""
+
+    def __init__(self, max_entries, min_entries=50, target_seconds=CUSTOMBATCH_TARGET_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.min_entries = min(min_entries, self.max_entries)
+        self.target_seconds = target_seconds
+        self.limit = self.max_entries
+
+    def observe(self, entries, elapsed):
+        if elapsed > self.target_seconds:
+            # Too slow: aim the next chunk at the target latency
+            self.limit = max(self.min_entries, int(entries * self.target_seconds / elapsed))
+        elif elapsed < self.target_seconds / 2 and entries >= self.limit:
+            self.limit = min(self.max_entries, int(self.limit * 1.5) + 1)
+
+    def failed(self, entries):
+        self.limit = max(self.min_entries, min(self.limit, entries // 2))
+
+def _error_message(e):
+    try:
+        return json.loads(e.content)['error']['message']
+    except Exception:
+        return str(e)
+
+def _status(e):
+    return getattr(getattr(e, 'resp', None), 'status', None)
+
+def _bisectable(e):
+    # A rejected payload, or a call that timed out: a smaller chunk may go through,
+    # and halving narrows a rejection down to the entries that caused it.
+    # Auth, quota and server errors hit every entry alike
+    if isinstance(e, (socket.timeout, TimeoutError)):
+        return True
+    return _status(e) in (400, 408, 413)
+
+def _transient(e):
+    # Outages, throttling and dropped connections: the same chunk may succeed later
+    status = _status(e)
+    if status is None:
+        return isinstance(e, OSError) and not isinstance(e, (socket.timeout, TimeoutError))
+    return status == 429 or status >= 500
+
+class RateLimiter:
+    """Spaces calls at least 60/calls_per_minute seconds apart, across threads."""
+
+    def __init__(self, calls_per_minute):
+        self.interval = 60.0 / calls_per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
 class GMCManager:
-    def __init__(self, merchant_id, key_file_path):
+    def __init__(self, merchant_id, key_file_path=KEY_FILE, batch_workers=None, calls_per_minute=None,
+                 credentials=None):
+        """
+        credentials: a google-auth credentials object to use instead of
+        key_file_path. Without either, the GOOGLE_CREDENTIALS env var is
+        used (see credentials_provider.get_credentials).
+        """
         self.merchant_id = merchant_id
-        if not os.path.exists(key_file_path):
+        if credentials is None and not os.path.exists(key_file_path) and not os.getenv('GOOGLE_CREDENTIALS'):
             raise FileNotFoundError(f"Missing Key File: {key_file_path}")
-            
-        self.creds = service_account.Credentials.from_service_account_file(
-            key_file_path, scopes=['https://www.googleapis.com/auth/content']
-        )
-        self.service = build('content', 'v2.1', credentials=self.creds)
+
+        # Per-account quota: custombatch calls in flight and calls per minute
+        self.batch_workers = batch_workers or CUSTOMBATCH_WORKERS
+        self._limiter = RateLimiter(calls_per_minute) if calls_per_minute else None
+
+        # Credentials and the API client are built on first use, so importing
+        # this module and constructing the manager stay cheap on cold starts.
+        self.key_file_path = key_file_path
+        self._credentials = credentials
+        self._service = None
+        self._lock = threading.Lock()
+        # httplib2.Http is not thread-safe: every thread gets its own
+        # keep-alive connection, reused for all of that thread's calls.
+        self._local = threading.local()
         print(f"[GMC] Engine ready (Merchant ID: {merchant_id})")
 
+    @property
+    def creds(self):
+        if self._credentials is not None:
+            return self._credentials
+        # Shared per process by credentials_provider (one key parse, one token)
+        return get_credentials(self.key_file_path)
+
+    @property
+    def service(self):
+        """Content API client, built once on first use and safe to share across threads."""
+        if self._service is None:
+            http = self._thread_http()
+            with self._lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build
+                    # Use the discovery document bundled with the client library
+                    # instead of fetching it over the network on every start.
+                    self._service = build(
+                        'content', 'v2.1', http=http, requestBuilder=self._build_request,
+                        static_discovery=True, cache_discovery=False
+                    )
+        return self._service
+
+    def _thread_http(self):
+        """Authorized keep-alive transport for the calling thread."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http(timeout=120))
+            self._local.http = http
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        # Bind each request to the thread that builds it, not the shared service http
+        from googleapiclient.http import HttpRequest
+        # Refresh ahead of expiry once for all threads, not per connection
+        ensure_fresh(self.creds)
+        return HttpRequest(self._thread_http(), *args, **kwargs)
+
     def extract_weight_from_label(self, variant_label):
         """Extract weight/volume from variant label like '250 ml', '100 g', '5ltr'"""
         if not variant_label:
@@ -69,7 +196,7 @@ class GMCManager:
         # FIXED: Use the verified GMC domain
         store_domain = "https://gmc-dashboard.vercel.app"
         slug = data.get('slug', data.get('produrltitle', data['objectID']))
-        link = f"{store_domain}/products/{data['objectID']}"
+        link = landing_page(data['objectID'], country)
 
         # FIXED: Build image URL - use direct image links
         image = data.get('image', data.get('featured_img', ''))
@@ -132,7 +259,7 @@ class GMCManager:
             'contentLanguage': 'en',
             'targetCountry': country,
             'channel': 'online',
-            'availability': 'in stock',
+            'availability': product_availability(data),
             'condition': 'new',
             'brand': data.get('brand', 'Generic'),
             'price': {
@@ -147,6 +274,53 @@ class GMCManager:
 
         return body
 
+    @staticmethod
+    def format_catalog_product(product, country, country_cfg):
+        """Format a products.json entry for one country from country_config.json."""
+        offer_id = f"{product['code']}-{country}"
+        title = product.get('productname', 'Unknown Product')
+        slug = product.get('produrltitle', product['code'])
+
+        # Regional price computed by update_global_prices.py
+        price = product.get('regional_prices', {}).get(country, {}).get('price', 0)
+
+        image = product.get('featured_img', '')
+        if 'unsplash.com' in image and 'fm=jpg' not in image:
+            image = image.replace('?', '?fm=jpg&') if '?' in image else f"{image}?fm=jpg"
+        if not image or 'example.com' in image:
+            image = "https://images.unsplash.com/photo-1606923829579-0cb981a83e2e?w=800&h=800&fit=crop&fm=jpg"
+
+        additional_image_links = [img for img in product.get('additional_images', []) if img and img != image][:10]
+
+        return {
+            'offerId': offer_id,
+            'title': title,
+            'description': product.get('indepthdescn', product.get('briedfdescn', title))[:5000],
+            'link': landing_page(slug, country),
+            'imageLink': image,
+            'additionalImageLinks': additional_image_links,
+            'contentLanguage': 'en',
+            'targetCountry': country,
+            'feedLabel': country,
+            'channel': 'online',
+            'availability': product_availability(product),
+            'condition': 'new',
+            'brand': product.get('brand', 'Generic'),
+            'price': {
+                'value': f"{price:.2f}",
+                'currency': country_cfg['currency']
+            },
+            'shipping': [{
+                'country': country,
+                'service': 'Standard Shipping',
+                'price': {
+                    'value': f"{country_cfg.get('shipping_cost', 9.99):.2f}",
+                    'currency': country_cfg['currency']
+                }
+            }],
+            'identifierExists': False
+        }
+
     def push_to_google(self, body):
         """Push a single product to Google."""
         try:
@@ -184,66 +358,165 @@ class GMCManager:
                 
             return False, error_msg
 
-    def list_all_products(self):
-        """List all products in the Merchant Center account."""
-        products = []
-        request = self.service.products().list(merchantId=self.merchant_id)
-        
+    def iter_product_pages(self, page_size=250):
+        """Yield the account's products one page (list of resources) at a time."""
+        request = self.service.products().list(merchantId=self.merchant_id, maxResults=page_size)
+
         while request is not None:
             result = request.execute()
-            if 'resources' in result:
-                products.extend(result['resources'])
+            yield result.get('resources', [])
             request = self.service.products().list_next(previous_request=request, previous_response=result)
-            
+
+    def list_all_products(self):
+        """List all products in the Merchant Center account."""
+        products = []
+        for page in self.iter_product_pages():
+            products.extend(page)
         return products
 
-    def batch_push(self, product_bodies, batch_size=5000):
+    def _send_chunk(self, chunk):
+        """Send one chunk, retrying transient errors with exponential backoff."""
+        for attempt in range(CUSTOMBATCH_RETRIES + 1):
+            if self._limiter:
+                self._limiter.wait()
+            start = time.monotonic()
+            try:
+                result = self.service.products().custombatch(body={'entries': chunk}).execute()
+                return result, time.monotonic() - start
+            except (HttpError, OSError) as e:
+                if attempt == CUSTOMBATCH_RETRIES or not _transient(e):
+                    raise
+                delay = CUSTOMBATCH_BACKOFF * 2 ** attempt
+                print(f"[BATCH] Chunk of {len(chunk)} failed ({_error_message(e)}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    def _custombatch(self, entries, batch_size, ignore_errors=()):
         """
-        Push multiple products in a single API call using custombatch.
-        Up to 10,000 products per batch. Returns (success_count, fail_count, errors)
+        Run custombatch entries in chunks. Each entry's batchId must be its index.
+        Entry errors whose message contains one of ignore_errors count as success.
+
+        batch_size is the upper bound per chunk; chunks are also capped by
+        serialized size and resized from observed latency (BatchSizer). Up to
+        batch_workers chunks are in flight at once. Transient errors (5xx,
+        429, dropped connections) retry the same chunk with backoff; a chunk
+        whose payload the API rejects (400/413) or that times out (408,
+        socket timeout) is split in half and retried, so one bad entry only
+        fails itself and later chunks are sent smaller.
+        Returns (success_count, fail_count, errors)
         """
         total_success = 0
         total_fail = 0
         all_errors = []
-        
-        # Process in chunks
-        for i in range(0, len(product_bodies), batch_size):
-            chunk = product_bodies[i:i + batch_size]
-            
-            # Build batch request
-            entries = []
-            for idx, body in enumerate(chunk):
-                entries.append({
-                    'batchId': i + idx,
-                    'merchantId': self.merchant_id,
-                    'method': 'insert',
-                    'product': body
-                })
-            
-            batch_request = {'entries': entries}
-            
-            try:
-                result = self.service.products().custombatch(body=batch_request).execute()
-                
-                # Process results
-                for entry in result.get('entries', []):
-                    if entry.get('errors'):
-                        total_fail += 1
+
+        sizes = [len(json.dumps(entry, separators=(',', ':'))) for entry in entries]
+        sizer = BatchSizer(batch_size)
+        retry = deque()  # (start, end) halves of rejected chunks, sent first
+        cursor = 0
+        running = {}
+
+        def next_span():
+            nonlocal cursor
+            if retry:
+                return retry.popleft()
+            if cursor >= len(entries):
+                return None
+            start = end = cursor
+            payload = 0
+            while end < len(entries) and end - start < sizer.limit:
+                if end > start and payload + sizes[end] > CUSTOMBATCH_MAX_BYTES:
+                    break
+                payload += sizes[end]
+                end += 1
+            cursor = end
+            return start, end
+
+        with ThreadPoolExecutor(max_workers=self.batch_workers) as pool:
+            while True:
+                while len(running) < self.batch_workers:
+                    span = next_span()
+                    if span is None:
+                        break
+                    running[pool.submit(self._send_chunk, entries[span[0]:span[1]])] = span
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = running.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                    except (HttpError, OSError) as e:
+                        error_msg = _error_message(e)
+                        if end - start > 1 and _bisectable(e):
+                            print(f"[BATCH] Chunk of {end - start} rejected or timed out ({error_msg}), splitting")
+                            sizer.failed(end - start)
+                            mid = (start + end) // 2
+                            retry.extend(((start, mid), (mid, end)))
+                            continue
+                        # Single entry, the account, or retries used up
+                        total_fail += end - start
                         all_errors.append({
-                            'batchId': entry.get('batchId'),
-                            'errors': entry.get('errors')
+                            'batch_error': error_msg,
+                            'batchIds': [entry['batchId'] for entry in entries[start:end]]
                         })
-                    else:
-                        total_success += 1
-                        
-            except HttpError as e:
-                # If entire batch fails
-                total_fail += len(chunk)
-                try:
-                    error_msg = json.loads(e.content)['error']['message']
-                except:
-                    error_msg = str(e)
-                all_errors.append({'batch_error': error_msg})
-        
+                        continue
+
+                    sizer.observe(end - start, elapsed)
+
+                    # Process results
+                    for entry in result.get('entries', []):
+                        errors = entry.get('errors')
+                        if errors and not any(
+                            token in str(errors.get('message', '')).lower() for token in ignore_errors
+                        ):
+                            total_fail += 1
+                            all_errors.append({
+                                'batchId': entry.get('batchId'),
+                                'errors': errors
+                            })
+                        else:
+                            total_success += 1
+
         return total_success, total_fail, all_errors
 
+    def batch_push(self, product_bodies, batch_size=5000):
+        """
+        Push multiple products using custombatch. batch_size caps the entries per
+        call (API maximum 10,000). Returns (success_count, fail_count, errors)
+        """
+        entries = [{
+            'batchId': idx,
+            'merchantId': self.merchant_id,
+            'method': 'insert',
+            'product': body
+        } for idx, body in enumerate(product_bodies)]
+        return self._custombatch(entries, batch_size)
+
+    def batch_update(self, updates, update_mask='price,availability', batch_size=10000):
+        """
+        Partial updates using custombatch: only the fields in update_mask are
+        sent and changed. updates: list of (product_id, partial_body).
+        Returns (success_count, fail_count, errors)
+        """
+        entries = [{
+            'batchId': idx,
+            'merchantId': self.merchant_id,
+            'method': 'update',
+            'productId': product_id,
+            'updateMask': update_mask,
+            'product': body
+        } for idx, (product_id, body) in enumerate(updates)]
+        return self._custombatch(entries, batch_size)
+
+    def batch_delete(self, product_ids, batch_size=5000):
+        """
+        Delete multiple products (REST IDs like online:en:US:PRD-00001-US) using custombatch.
+        Products that are already gone count as deleted. Returns (success_count, fail_count, errors)
+        """
+        entries = [{
+            'batchId': idx,
+            'merchantId': self.merchant_id,
+            'method': 'delete',
+            'productId': product_id
+        } for idx, product_id in enumerate(product_ids)]
+        return self._custombatch(entries, batch_size, ignore_errors=('not found',))
@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration for production
+Start with: gunicorn -c gunicorn.conf.py "server:create_app()"
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+# Sized for the container's memory, not the host's CPU count: every worker
+# holds its own catalog snapshot once products.json changes (512MB on Render free)
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Import the app (and load the catalog) once in the master, then fork
+preload_app = True
+
+def post_fork(server, worker):
+    # API clients are per-process: build them after the fork
+    from server import init_worker
+    init_worker()
+
+def child_exit(server, worker):
+    # Sync tickets the worker still had queued go to the next worker that starts
+    from sync_queue import release_tickets
+    release_tickets(worker.pid)
@@ -0,0 +1,175 @@
+"""
+Image Validator - Check image links before they are pushed to GMC
+HEAD-checks every unique featured_img / additional_images URL with asyncio
+(aiohttp), with a global concurrency cap and a per-host connection limit.
+Results go into the image_url_cache table of gmc_state.db, so a URL shared
+by thousands of products (CATEGORY_IMAGES) is checked once per TTL.
+
+Only definite failures count as broken (4xx, or a response that is not an
+image); timeouts, connection errors and 5xx are treated as unknown and are
+neither cached nor removed, so a network hiccup never strips a catalog.
+
+Usage: python image_validator.py [--refresh] [URL ...]
+"""
+import sys
+import asyncio
+import copy
+import os
+import time
+from urllib.parse import urlsplit
+import database
+
+# Seconds a result stays valid; broken links are re-checked sooner
+CACHE_TTL = float(os.getenv('GMC_IMAGE_CACHE_TTL', 7 * 24 * 3600))
+BROKEN_TTL = float(os.getenv('GMC_IMAGE_BROKEN_TTL', 6 * 3600))
+CONCURRENCY = 100
+PER_HOST = 8
+TIMEOUT = 10
+
+def product_images(product):
+    """All image URLs a product would push."""
+    urls = []
+    if product.get('featured_img'):
+        urls.append(product['featured_img'])
+    urls.extend(img for img in product.get('additional_images') or [] if img)
+    return urls
+
+def _checkable(url):
+    return urlsplit(url).scheme in ('http', 'https')
+
+async def _check(session, semaphore, url):
+    async with semaphore:
+        return await _request(session, url)
+
+async def _request(session, url):
+    """(url, ok, status): ok is True/False, or None when the result is unknown."""
+    import aiohttp
+    try:
+        async with session.head(url, allow_redirects=True) as resp:
+            status = resp.status
+            content_type = resp.headers.get('Content-Type', '')
+        if status in (405, 501):
+            # Server does not do HEAD: fetch the first byte instead
+            async with session.get(url, allow_redirects=True, headers={'Range': 'bytes=0-0'}) as resp:
+                status = resp.status
+                content_type = resp.headers.get('Content-Type', '')
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return url, None, None
+
+    if 200 <= status < 300:
+        return url, not content_type or content_type.startswith('image/'), status
+    if 400 <= status < 500 and status != 429:
+        return url, False, status
+    return url, None, status
+
+async def _check_all(urls, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT):
+    import aiohttp
+    # The semaphore caps checks in flight; the connector caps connections per
+    # host. Timeouts cover connecting and reading only, not the wait for a
+    # free connection, so URLs queued behind a busy host don't time out.
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        return await asyncio.gather(*(_check(session, semaphore, url) for url in urls))
+
+def check_urls(urls, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT):
+    """Check URLs over the network (no cache). Returns [(url, ok, status)]."""
+    return asyncio.run(_check_all(list(urls), concurrency, per_host, timeout))
+
+def validate_urls(urls, ttl=CACHE_TTL, broken_ttl=BROKEN_TTL, refresh=False, **check_args):
+    """
+    {url: ok} for every unique URL, from the cache where fresh and checked
+    otherwise. ok is None when the URL could not be checked.
+    """
+    unique = {url for url in urls if url}
+    # Relative or odd links can't be checked here; leave them to the formatters
+    results = {url: None for url in unique if not _checkable(url)}
+    unique -= results.keys()
+
+    now = time.time()
+    conn = database.connect()
+    try:
+        if not refresh:
+            ordered = sorted(unique)
+            for i in range(0, len(ordered), 500):
+                chunk = ordered[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT url, ok, checked_at FROM image_url_cache WHERE url IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                for url, ok, checked_at in rows:
+                    if now - checked_at < (ttl if ok else broken_ttl):
+                        results[url] = bool(ok)
+
+        pending = [url for url in unique if url not in results]
+        if pending:
+            print(f"[IMAGES] Checking {len(pending)} image URLs ({len(unique) - len(pending)} cached)")
+            rows = []
+            for url, ok, status in check_urls(pending, **check_args):
+                results[url] = ok
+                if ok is not None:
+                    rows.append((url, int(ok), status, now))
+            conn.executemany('''INSERT OR REPLACE INTO image_url_cache
+                                (url, ok, status, checked_at) VALUES (?, ?, ?, ?)''', rows)
+            conn.commit()
+    finally:
+        conn.close()
+    return results
+
+def broken_images(products, **kwargs):
+    """Set of image URLs used by products that are known to be broken."""
+    results = validate_urls((url for p in products for url in product_images(p)), **kwargs)
+    return {url for url, ok in results.items() if ok is False}
+
+def strip_broken(product, broken):
+    """
+    The product without broken image links: the same object when nothing is
+    broken, else a copy. A broken featured_img is replaced by the first good
+    additional image (or left empty for the formatter's placeholder).
+    """
+    images = product_images(product)
+    if not broken or not any(url in broken for url in images):
+        return product
+
+    additional = [img for img in product.get('additional_images') or [] if img and img not in broken]
+    featured = product.get('featured_img') or ''
+    if featured in broken:
+        featured = additional[0] if additional else ''
+
+    if isinstance(product, dict):
+        return dict(product, featured_img=featured, additional_images=additional)
+    clean = copy.copy(product)
+    clean.featured_img = featured
+    clean.additional_images = tuple(additional)
+    return clean
+
+def main():
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Check product image links (cached in gmc_state.db)')
+    parser.add_argument('urls', nargs='*', help='URLs to check (default: every image in products.json)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--per-host', type=int, default=PER_HOST)
+    args = parser.parse_args()
+
+    urls = args.urls
+    if not urls:
+        with open('products.json', 'r', encoding='utf-8') as f:
+            urls = [url for p in json.load(f).get('products', []) for url in product_images(p)]
+
+    start = time.time()
+    results = validate_urls(urls, refresh=args.refresh, concurrency=args.concurrency, per_host=args.per_host)
+    broken = sorted(url for url, ok in results.items() if ok is False)
+    unknown = sorted(url for url, ok in results.items() if ok is None)
+
+    print(f"✓ OK:      {sum(1 for ok in results.values() if ok)}")
+    print(f"✗ Broken:  {len(broken)}")
+    print(f"? Unknown: {len(unknown)}")
+    print(f"⏱ Time:    {time.time() - start:.2f} seconds")
+    for url in broken[:20]:
+        print(f"  - {url}")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,284 @@
+"""
+Inventory Mirror - Local copy of what is live in Google Merchant Center
+Streams product listings page by page into the gmc_mirror table of
+gmc_state.db, keyed by (merchant, offer ID, feed label).
+
+- Pages are written as they arrive; only one page per source is in memory
+- Several listing sources are fetched in parallel, with a single DB writer
+- Refreshes are incremental: unchanged rows are not rewritten, and sources
+  refreshed within max_age are skipped entirely
+- Push paths can write confirmed results through with record()/remove(),
+  keeping the mirror current between full listings
+"""
+import sys
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import database
+
+# Attributes we control when pushing. Both APIs are reduced to this shape so
+# the mirror can be compared against locally formatted products.
+CANONICAL_FIELDS = (
+    'title', 'description', 'link', 'imageLink', 'additionalImageLinks',
+    'availability', 'brand', 'price', 'shipping',
+)
+
+_DONE = object()
+
+def canonical_from_content(resource):
+    """Reduce a Content API product resource/body to the canonical fields."""
+    price = resource.get('price') or {}
+    return {
+        'title': resource.get('title', ''),
+        'description': resource.get('description', ''),
+        'link': resource.get('link', ''),
+        'imageLink': resource.get('imageLink', ''),
+        'additionalImageLinks': list(resource.get('additionalImageLinks') or []),
+        'availability': str(resource.get('availability', '')).replace('_', ' '),
+        'brand': resource.get('brand', ''),
+        'price': [f"{float(price.get('value') or 0):.2f}", price.get('currency', '')],
+        'shipping': sorted(
+            [s.get('country', ''), s.get('service', ''),
+             f"{float((s.get('price') or {}).get('value') or 0):.2f}", (s.get('price') or {}).get('currency', '')]
+            for s in resource.get('shipping') or []
+        ),
+    }
+
+def canonical_from_merchant(product):
+    """Reduce a Merchant API Product/ProductInput to the canonical fields."""
+    attrs = product.attributes
+    price = getattr(attrs, 'price', None)
+    amount = (price.amount_micros / 1_000_000) if price else 0
+    return {
+        'title': attrs.title or '',
+        'description': attrs.description or '',
+        'link': attrs.link or '',
+        'imageLink': attrs.image_link or '',
+        'additionalImageLinks': list(attrs.additional_image_links),
+        'availability': str(attrs.availability or '').replace('_', ' '),
+        'brand': attrs.brand or '',
+        'price': [f"{amount:.2f}", price.currency_code if price else ''],
+        'shipping': sorted(
+            [s.country or '', s.service or '',
+             f"{(s.price.amount_micros / 1_000_000) if s.price else 0:.2f}", s.price.currency_code if s.price else '']
+            for s in getattr(attrs, 'shipping', None) or []
+        ),
+    }
+
+def fingerprint(canonical):
+    """Stable hash of a canonical product, used to detect drift."""
+    blob = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+def content_api_pages(gmc, page_size=250):
+    """Listing source over the Content API. Yields lists of mirror rows."""
+    for page in gmc.iter_product_pages(page_size):
+        rows = []
+        for resource in page:
+            canonical = canonical_from_content(resource)
+            rows.append((
+                resource['offerId'],
+                resource.get('feedLabel') or resource.get('targetCountry', ''),
+                resource.get('id'),
+                None,
+                canonical,
+            ))
+        yield rows
+
+def merchant_api_pages(manager, page_size=1000):
+    """Listing source over the Merchant API. Yields lists of mirror rows."""
+    for page in manager.iter_product_pages(page_size):
+        rows = []
+        for product in page:
+            canonical = canonical_from_merchant(product)
+            rows.append((
+                product.offer_id,
+                product.feed_label,
+                product.name,
+                product.data_source,
+                canonical,
+            ))
+        yield rows
+
+class InventoryMirror:
+    """Read/write access to one merchant's slice of the gmc_mirror table."""
+
+    def __init__(self, merchant_id):
+        self.merchant_id = str(merchant_id)
+        database.init_db()
+
+    def _upsert(self, conn, rows, source):
+        now = time.time()
+        conn.executemany('''INSERT INTO gmc_mirror
+                            (merchant_id, offer_id, feed_label, source, product_id,
+                             data_source, fingerprint, payload, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(merchant_id, offer_id, feed_label) DO UPDATE SET
+                            source=excluded.source,
+                            product_id=COALESCE(excluded.product_id, gmc_mirror.product_id),
+                            data_source=COALESCE(excluded.data_source, gmc_mirror.data_source),
+                            fingerprint=excluded.fingerprint,
+                            payload=excluded.payload,
+                            updated_at=excluded.updated_at
+                            WHERE gmc_mirror.fingerprint IS NOT excluded.fingerprint
+                               OR gmc_mirror.source IS NOT excluded.source''',
+                         [(self.merchant_id, offer_id, feed_label, source, product_id,
+                           data_source, fingerprint(canonical),
+                           json.dumps(canonical, separators=(',', ':')), now)
+                          for offer_id, feed_label, product_id, data_source, canonical in rows])
+
+    def refresh(self, sources, max_age=None, max_workers=4):
+        """
+        Stream every source into the mirror.
+
+        sources: {name: callable returning an iterator of row pages}. Sources
+        must not overlap; rows a completed source no longer lists are removed.
+        Returns {name: item_count or Exception}.
+        """
+        conn = database.connect()
+        try:
+            due = dict(sources)
+            if max_age is not None:
+                cutoff = time.time() - max_age
+                fresh = {row[0] for row in conn.execute(
+                    'SELECT source FROM gmc_mirror_sync WHERE merchant_id=? AND refreshed_at>=?',
+                    (self.merchant_id, cutoff))}
+                due = {name: f for name, f in due.items() if name not in fresh}
+            if not due:
+                return {}
+
+            # Bounded queue: producers block instead of buffering the account
+            pages = queue.Queue(maxsize=max_workers * 4)
+            slots = threading.Semaphore(max_workers)
+
+            def produce(name, factory):
+                with slots:
+                    try:
+                        for rows in factory():
+                            pages.put((name, rows))
+                        pages.put((name, _DONE))
+                    except Exception as e:
+                        pages.put((name, e))
+
+            for name, factory in due.items():
+                threading.Thread(target=produce, args=(name, factory), daemon=True).start()
+
+            conn.execute('''CREATE TEMP TABLE IF NOT EXISTS mirror_seen
+                            (offer_id TEXT, feed_label TEXT, PRIMARY KEY (offer_id, feed_label))''')
+            conn.execute('DELETE FROM mirror_seen')
+
+            results = {name: 0 for name in due}
+            pending = len(due)
+            while pending:
+                name, item = pages.get()
+                if item is _DONE or isinstance(item, Exception):
+                    pending -= 1
+                    if isinstance(item, Exception):
+                        print(f"[MIRROR] {name}: listing failed: {item}")
+                        results[name] = item
+                    continue
+                self._upsert(conn, item, name)
+                conn.executemany('INSERT OR IGNORE INTO mirror_seen VALUES (?, ?)',
+                                 [(row[0], row[1]) for row in item])
+                conn.commit()
+                results[name] += len(item)
+
+            # Prune offers that completed sources no longer list
+            completed = [name for name, r in results.items() if not isinstance(r, Exception)]
+            prune = ['source=?'] * len(completed)
+            params = list(completed)
+            if len(completed) == len(due) == len(sources):
+                # Every source listed in full: write-through rows not seen are gone too
+                prune.append('source IS NULL')
+            if prune:
+                conn.execute(f'''DELETE FROM gmc_mirror WHERE merchant_id=? AND ({' OR '.join(prune)})
+                                 AND NOT EXISTS (SELECT 1 FROM mirror_seen s
+                                                 WHERE s.offer_id=gmc_mirror.offer_id
+                                                 AND s.feed_label=gmc_mirror.feed_label)''',
+                             [self.merchant_id] + params)
+            now = time.time()
+            conn.executemany('''INSERT OR REPLACE INTO gmc_mirror_sync
+                                (merchant_id, source, refreshed_at, item_count) VALUES (?, ?, ?, ?)''',
+                             [(self.merchant_id, name, now, results[name]) for name in completed])
+            conn.commit()
+            return results
+        finally:
+            conn.close()
+
+    def record(self, rows):
+        """Write-through confirmed pushes: rows of (offer_id, feed_label, product_id, data_source, canonical)."""
+        conn = database.connect()
+        try:
+            self._upsert(conn, rows, None)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def remove(self, keys):
+        """Write-through confirmed deletes: iterable of (offer_id, feed_label)."""
+        conn = database.connect()
+        try:
+            conn.executemany('DELETE FROM gmc_mirror WHERE merchant_id=? AND offer_id=? AND feed_label=?',
+                             [(self.merchant_id, offer_id, feed_label) for offer_id, feed_label in keys])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fingerprints(self):
+        """Return {(offer_id, feed_label): (fingerprint, product_id)} for this merchant."""
+        conn = database.connect()
+        try:
+            return {(offer_id, feed_label): (fp, product_id)
+                    for offer_id, feed_label, fp, product_id in conn.execute(
+                        '''SELECT offer_id, feed_label, fingerprint, product_id
+                           FROM gmc_mirror WHERE merchant_id=?''', (self.merchant_id,))}
+        finally:
+            conn.close()
+
+    def count(self):
+        conn = database.connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM gmc_mirror WHERE merchant_id=?',
+                                (self.merchant_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Mirror live GMC inventory into gmc_state.db')
+    parser.add_argument('--content-api', action='store_true', help='List via Content API instead of Merchant API')
+    parser.add_argument('--max-age', type=float, default=None, help='Skip if refreshed within this many seconds')
+    args = parser.parse_args()
+
+    merchant_id = os.getenv('GMC_MERCHANT_ID')
+    if not merchant_id:
+        print("[ERROR] GMC_MERCHANT_ID not set in .env file!")
+        return
+
+    if args.content_api:
+        from gmc_manager import GMCManager
+        gmc = GMCManager(merchant_id, 'service_account.json')
+        sources = {'content_api': lambda: content_api_pages(gmc)}
+    else:
+        from merchant_api_manager import MerchantAPIManager
+        manager = MerchantAPIManager(merchant_id)
+        sources = {'merchant_api': lambda: merchant_api_pages(manager)}
+
+    mirror = InventoryMirror(merchant_id)
+    start = time.time()
+    results = mirror.refresh(sources, max_age=args.max_age)
+    if not results:
+        print("[MIRROR] Up to date, nothing to refresh")
+    for name, result in results.items():
+        print(f"  {name}: {result}")
+    print(f"[MIRROR] {mirror.count()} offers mirrored ({time.time() - start:.2f}s)")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
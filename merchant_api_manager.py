@@ -10,17 +10,13 @@ Benefits:
 """
 import os
 import json
-from google.oauth2 import service_account
-from google.shopping.merchant_products_v1beta import ProductInputsServiceClient
-from google.shopping.merchant_products_v1beta import ProductsServiceClient
-from google.shopping.merchant_products_v1beta.types import (
-    ProductInput,
-    InsertProductInputRequest,
-    Attributes,
-    Price,
-    Shipping,
-    ShippingWeight,
-)
+import threading
+from catalog import landing_page, product_availability
+from credentials_provider import get_credentials
+
+# google-shopping-* pulls in grpc and proto-plus, which dominate import time.
+# They are imported inside the methods that need them so that importing this
+# module (e.g. from the web server) stays cheap.
 
 class MerchantAPIManager:
     """
@@ -28,36 +24,69 @@ class MerchantAPIManager:
     Migration from Content API for Shopping
     """
     
-    def __init__(self, merchant_id, credentials_file='service_account.json', data_source_id=None):
+    def __init__(self, merchant_id, credentials_file='service_account.json', data_source_id=None,
+                 country_config='country_config.json', data_sources_path=None):
         """Initialize the Merchant API client."""
         self.merchant_id = merchant_id
         self.account = f"accounts/{merchant_id}"
         
-        # Data source is required for Merchant API
-        # You need to create one in Merchant Center or via API
+        # Data source is required for Merchant API. If not given, it is
+        # resolved per feed label from the data source registry (this
+        # account's config and data sources file, see merchants.py).
         self.data_source_id = data_source_id
+        self.country_config = country_config
+        self.data_sources_path = data_sources_path
         if data_source_id:
             self.data_source = f"accounts/{merchant_id}/dataSources/{data_source_id}"
         else:
             self.data_source = None
-        
-        # Load credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_file,
-            scopes=['https://www.googleapis.com/auth/content']
-        )
-        
-        # Initialize clients
-        self.product_inputs_client = ProductInputsServiceClient(credentials=credentials)
-        self.products_client = ProductsServiceClient(credentials=credentials)
-        
+
+        # Credentials and gRPC clients are created lazily on first use
+        self.credentials_file = credentials_file
+        self._product_inputs_client = None
+        self._products_client = None
+        self._lock = threading.Lock()
+
         print(f"[Merchant API] Ready (Account: {merchant_id})")
+
+    def _get_credentials(self):
+        return get_credentials(self.credentials_file)
+
+    @property
+    def product_inputs_client(self):
+        if self._product_inputs_client is None:
+            with self._lock:
+                if self._product_inputs_client is None:
+                    from google.shopping.merchant_products_v1beta import ProductInputsServiceClient
+                    self._product_inputs_client = ProductInputsServiceClient(
+                        credentials=self._get_credentials()
+                    )
+        return self._product_inputs_client
+
+    @property
+    def products_client(self):
+        if self._products_client is None:
+            with self._lock:
+                if self._products_client is None:
+                    from google.shopping.merchant_products_v1beta import ProductsServiceClient
+                    self._products_client = ProductsServiceClient(
+                        credentials=self._get_credentials()
+                    )
+        return self._products_client
     
     def format_product(self, data, country, currency):
         """
         Format product data for Merchant API.
         Returns a ProductInput protobuf object.
         """
+        from google.shopping.merchant_products_v1beta.types import (
+            ProductInput,
+            Attributes,
+            Price,
+            Shipping,
+            ShippingWeight,
+        )
+
         offer_id = f"{data['objectID']}-{country}"
         title = data.get('productname', data.get('title', 'Unknown Product'))
         slug = data.get('produrltitle', data.get('slug', data['objectID']))
@@ -89,10 +118,10 @@ class MerchantAPIManager:
             attributes=Attributes(
                 title=title,
                 description=data.get('description', data.get('briedfdescn', title)),
-                link=f"https://gmc-dashboard.vercel.app/products/{slug}",
+                link=landing_page(slug, country),
                 image_link=image,
                 additional_image_links=additional_images,
-                availability="in stock",
+                availability=product_availability(data),
                 condition="new",
                 brand=data.get('brand', 'Generic'),
                 price=Price(
@@ -123,14 +152,23 @@ class MerchantAPIManager:
         """
         Insert a single product using productInputs.insert
         """
-        if not self.data_source:
+        data_source = self.data_source
+        if not data_source:
+            # Look it up by feed label in the cached data source registry
+            from data_source_registry import get_data_source
+            data_source = get_data_source(self.merchant_id, product_input.feed_label,
+                                          config_path=self.country_config, path=self.data_sources_path,
+                                          key_file=self.credentials_file)
+        if not data_source:
             raise ValueError("Data source ID is required. Set it in constructor or create one in Merchant Center.")
-        
+
+        from google.shopping.merchant_products_v1beta.types import InsertProductInputRequest
+
         try:
             request = InsertProductInputRequest(
                 parent=self.account,
                 product_input=product_input,
-                data_source=self.data_source
+                data_source=data_source
             )
             
             response = self.product_inputs_client.insert_product_input(request=request)
@@ -162,21 +200,26 @@ class MerchantAPIManager:
         
         return success, fail, errors
     
+    def iter_product_pages(self, page_size=1000):
+        """
+        Yield processed products one page (list of Product) at a time.
+        Only the current page is held in memory.
+        """
+        request = {
+            "parent": self.account,
+            "page_size": page_size
+        }
+        for page in self.products_client.list_products(request=request).pages:
+            yield list(page.products)
+
     def list_products(self, page_size=1000):
         """
         List products (Merchant API supports up to 1000 per page!)
         """
         products = []
         try:
-            # Use the products client to list processed products
-            request = {
-                "parent": self.account,
-                "page_size": page_size
-            }
-            
-            for product in self.products_client.list_products(request=request):
-                products.append(product)
-                
+            for page in self.iter_product_pages(page_size):
+                products.extend(page)
         except Exception as e:
             print(f"[ERROR] Failed to list products: {e}")
         
@@ -0,0 +1,54 @@
+"""
+Merchants - The Merchant Center accounts this installation syncs
+Read from merchants.json (or GMC_MERCHANTS_FILE):
+
+    {
+      "merchants": [
+        {"name": "main", "merchant_id": "5701870248"},
+        {"name": "eu-store", "merchant_id": "1234567890",
+         "key_file": "eu_service_account.json",
+         "country_config": "country_config_eu.json",
+         "max_workers": 2, "calls_per_minute": 60}
+      ]
+    }
+
+Without the file, the single GMC_MERCHANT_ID account is used with the
+existing country_config.json / data_sources.json / product_flags state.
+Every other account gets its own data_sources_{merchant_id}.json cache and
+its own namespace (merchant_push_state) in gmc_state.db.
+"""
+import json
+import os
+from fetch_data_sources import DATA_SOURCES_FILE
+
+MERCHANTS_FILE = os.getenv('GMC_MERCHANTS_FILE', 'merchants.json')
+
+def _defaults(entry, primary):
+    merchant_id = str(entry['merchant_id'])
+    is_primary = merchant_id == primary
+    return {
+        'name': entry.get('name', merchant_id),
+        'merchant_id': merchant_id,
+        'key_file': entry.get('key_file', 'service_account.json'),
+        'country_config': entry.get('country_config', 'country_config.json'),
+        'data_sources': entry.get('data_sources',
+                                  DATA_SOURCES_FILE if is_primary else f"data_sources_{merchant_id}.json"),
+        # None = default product_flags state (the GMC_MERCHANT_ID account)
+        'state_namespace': None if is_primary else merchant_id,
+        'max_workers': entry.get('max_workers'),
+        'calls_per_minute': entry.get('calls_per_minute'),
+    }
+
+def load_merchants(path=MERCHANTS_FILE):
+    """List of merchant dicts (see module docstring for the keys)."""
+    primary = str(os.getenv('GMC_MERCHANT_ID') or '')
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f).get('merchants', [])
+        if not primary and entries:
+            # The first account owns the legacy files and state
+            primary = str(entries[0]['merchant_id'])
+        return [_defaults(entry, primary) for entry in entries]
+    if primary:
+        return [_defaults({'merchant_id': primary}, primary)]
+    return []
@@ -9,12 +9,20 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 import json
 import os
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
-from google.oauth2 import service_account
+from credentials_provider import get_credentials, ensure_fresh
+from data_source_registry import get_country_table
 from google.shopping.merchant_products_v1beta import ProductInputsServiceClient
 from google.shopping.merchant_products_v1beta import ProductInput, InsertProductInputRequest
 from google.shopping.merchant_products_v1beta.types import Attributes
 from google.type import money_pb2
+from push_journal import PushJournal, payload_hash
+from catalog import landing_page, load_records, product_availability
+from price_stock_sync import product_state
+from image_validator import broken_images, strip_broken
+import database
 
 load_dotenv()
 
@@ -67,10 +75,10 @@ def format_product_for_merchant_api(product, country_code, country_cfg, merchant
         attributes={
             "title": title,
             "description": product.get('indepthdescn', product.get('briedfdescn', title))[:5000],
-            "link": f"https://gmc-dashboard.vercel.app/products/{slug}",
+            "link": landing_page(slug, country_code),
             "image_link": image,
             "additional_image_links": additional_images,
-            "availability": "in_stock",
+            "availability": product_availability(product).replace(' ', '_'),
             "condition": "new",
             "brand": product.get('brand', 'Generic'),
             "identifier_exists": False,
@@ -79,9 +87,93 @@ def format_product_for_merchant_api(product, country_code, country_cfg, merchant
     
     return product_input, price, currency, shipping_cost
 
-def main():
-    merchant_id = os.getenv('GMC_MERCHANT_ID')
+def push_shard(client, merchant_id, products, country_code, country_cfg, confirmed):
+    """
+    Push one (country, SKU-range) shard.
+    Returns (country_code, results) with one (offer_id, digest, ok, error)
+    per product; ok is None for listings skipped as already confirmed.
+    """
     account = f"accounts/{merchant_id}"
+    data_source = f"accounts/{merchant_id}/dataSources/{country_cfg['data_source_id']}"
+    results = []
+    
+    for product in products:
+        offer_id = f"{product['code']}-{country_code}"
+        digest = None
+        try:
+            product_input, price, currency, shipping = format_product_for_merchant_api(
+                product, country_code, country_cfg, merchant_id
+            )
+            
+            digest = payload_hash(ProductInput.serialize(product_input))
+            if confirmed.get(offer_id) == digest:
+                results.append((offer_id, digest, None, None))
+                continue
+            
+            request = InsertProductInputRequest(
+                parent=account,
+                product_input=product_input,
+                data_source=data_source
+            )
+            
+            client.insert_product_input(request=request)
+            results.append((offer_id, digest, True, None))
+            
+        except Exception as e:
+            results.append((offer_id, digest, False, str(e)[:80]))
+    
+    return country_code, results
+
+def make_client(disk_cache=None):
+    credentials = ensure_fresh(get_credentials(disk_cache=disk_cache))
+    return ProductInputsServiceClient(credentials=credentials)
+
+# Per-process state for pool workers (set by _init_worker)
+_worker = {}
+
+def _init_worker(merchant_id, products):
+    # Each worker owns its gRPC channel; channels must not cross processes
+    # Token comes from the disk cache the parent just filled
+    _worker['client'] = make_client(disk_cache=True)
+    _worker['merchant_id'] = merchant_id
+    _worker['products'] = products
+
+def _run_shard(country_code, country_cfg, start, end, confirmed):
+    return push_shard(_worker['client'], _worker['merchant_id'], _worker['products'][start:end],
+                      country_code, country_cfg, confirmed)
+
+def iter_shard_results(merchant_id, products, enabled_countries, journal, workers=1, shard_size=500):
+    """
+    Split the work into (country, SKU-range) shards and yield each shard's
+    (country_code, results). With workers > 1 shards run on a process pool.
+    """
+    shards = []
+    for country_code, country_cfg in enabled_countries.items():
+        for start in range(0, len(products), shard_size):
+            end = min(start + shard_size, len(products))
+            offer_ids = [f"{p['code']}-{country_code}" for p in products[start:end]]
+            shards.append((country_code, country_cfg, start, end, journal.confirmed_subset(offer_ids)))
+    
+    if workers <= 1:
+        client = make_client()
+        print(f"[API] Merchant API client ready (Account: {merchant_id})")
+        for country_code, country_cfg, start, end, confirmed in shards:
+            yield push_shard(client, merchant_id, products[start:end], country_code, country_cfg, confirmed)
+        return
+    
+    print(f"[API] Sharding {len(shards)} shards across {workers} worker processes")
+    # Mint one token up front and share it with the workers through the disk cache
+    ensure_fresh(get_credentials(disk_cache=True))
+    # spawn: the parent may hold grpc state that is not fork-safe
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(merchant_id, products)) as pool:
+        futures = [pool.submit(_run_shard, *shard) for shard in shards]
+        for future in as_completed(futures):
+            yield future.result()
+
+def main(resume=False, workers=1, shard_size=500, check_images=True):
+    merchant_id = os.getenv('GMC_MERCHANT_ID')
     
     if not merchant_id:
         print("[ERROR] GMC_MERCHANT_ID not set in .env file!")
@@ -91,26 +183,21 @@ def main():
     print("MERCHANT API PUSH - New Google Merchant API")
     print("=" * 70)
     
-    # Load credentials
-    credentials = service_account.Credentials.from_service_account_file(
-        'service_account.json',
-        scopes=['https://www.googleapis.com/auth/content']
-    )
-    
-    # Initialize client
-    client = ProductInputsServiceClient(credentials=credentials)
-    print(f"[API] Merchant API client ready (Account: {merchant_id})")
-    
     # Load configuration
     config = load_country_config()
-    enabled_countries = get_enabled_countries(config)
+    # Data source IDs come from the cached registry, verified before any push
+    enabled_countries, problems = get_country_table(merchant_id, config)
+    if problems:
+        print("[ERROR] Data source check failed:")
+        for problem in problems:
+            print(f"  - {problem}")
+        print("Run fetch_data_sources.py or disable these countries in country_config.json.")
+        return
     
     print(f"[CONFIG] Enabled countries: {list(enabled_countries.keys())}")
     
-    # Load products
-    with open('products.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        products = data.get('products', [])
+    # Load products (compact records: only the fields the payload needs)
+    products = load_records('products.json')
     
     # Filter active products
     active_products = [p for p in products if str(p.get('gmc_active', 'yes')).lower() == 'yes']
@@ -120,46 +207,69 @@ def main():
         print("No active products to push.")
         return
     
+    # Leave out image links known to be broken (push state keeps the catalog values)
+    push_products = active_products
+    if check_images:
+        try:
+            broken = broken_images(active_products)
+        except Exception as e:
+            print(f"[IMAGES] Image check skipped: {e}")
+            broken = set()
+        if broken:
+            print(f"[IMAGES] {len(broken)} broken image URLs left out of the payloads")
+            push_products = [strip_broken(p, broken) for p in active_products]
+    
     # Push products
     print("\n" + "-" * 70)
     print("Pushing products via Merchant API...")
     print("-" * 70)
     
+    # Checkpoint journal: confirmed (offer, payload) pairs survive a crash
+    journal = PushJournal(merchant_id, resume=resume)
+    if journal.resumed:
+        print(f"[RESUME] Run #{journal.run_id}: {journal.confirmed_count} listings already confirmed, "
+              f"{journal.retrying} failed to retry")
+    else:
+        print(f"[JOURNAL] Run #{journal.run_id} started")
+    
     start_time = time.time()
-    total_success = 0
-    total_fail = 0
+    counts = {code: {'success': 0, 'fail': 0, 'skipped': 0} for code in enabled_countries}
     errors = []
+    failed_skus = set()
     
-    for country_code, country_cfg in enabled_countries.items():
-        data_source = f"accounts/{merchant_id}/dataSources/{country_cfg['data_source_id']}"
-        country_success = 0
-        country_fail = 0
-        
-        for product in active_products:
-            try:
-                product_input, price, currency, shipping = format_product_for_merchant_api(
-                    product, country_code, country_cfg, merchant_id
-                )
-                
-                request = InsertProductInputRequest(
-                    parent=account,
-                    product_input=product_input,
-                    data_source=data_source
-                )
-                
-                response = client.insert_product_input(request=request)
-                country_success += 1
-                
-            except Exception as e:
-                country_fail += 1
-                error_msg = str(e)[:80]
-                if len(errors) < 10:
-                    errors.append(f"{product['code']}-{country_code}: {error_msg}")
+    try:
+        for country_code, results in iter_shard_results(
+                merchant_id, push_products, enabled_countries, journal, workers, shard_size):
+            country = counts[country_code]
+            for offer_id, digest, ok, error in results:
+                if ok is None:
+                    country['skipped'] += 1
+                    continue
+                journal.record(offer_id, digest, ok, error)
+                if ok:
+                    country['success'] += 1
+                else:
+                    country['fail'] += 1
+                    failed_skus.add(offer_id[:-len(country_code) - 1])
+                    if len(errors) < 10:
+                        errors.append(f"{offer_id}: {error}")
         
-        total_success += country_success
-        total_fail += country_fail
-        print(f"  {country_code}: ✓ {country_success} | ✗ {country_fail}")
+        # Failed listings keep the run open, so --resume retries them
+        if not any(c['fail'] for c in counts.values()):
+            journal.finish()
+    finally:
+        journal.close()
     
+    # Baseline for the price/stock fast lane (price_stock_sync.py)
+    database.set_push_state([(p['code'],) + product_state(p) for p in active_products
+                             if p['code'] not in failed_skus])
+    
+    for country_code, country in counts.items():
+        print(f"  {country_code}: ✓ {country['success']} | ✗ {country['fail']} | ↷ {country['skipped']}")
+    
+    total_success = sum(c['success'] for c in counts.values())
+    total_fail = sum(c['fail'] for c in counts.values())
+    total_skipped = sum(c['skipped'] for c in counts.values())
     elapsed = time.time() - start_time
     
     # Summary
@@ -168,9 +278,12 @@ def main():
     print("=" * 70)
     print(f"✓ Success: {total_success}")
     print(f"✗ Failed:  {total_fail}")
+    print(f"↷ Skipped: {total_skipped} (already confirmed)")
     print(f"⏱ Time:    {elapsed:.2f} seconds")
     print(f"🌍 Countries: {list(enabled_countries.keys())}")
     print("=" * 70)
+    if total_fail:
+        print(f"[JOURNAL] Run #{journal.run_id} left open: rerun with --resume to retry failed listings")
     
     if errors:
         print(f"\n[ERRORS] First {len(errors)} errors:")
@@ -178,4 +291,15 @@ def main():
             print(f"  - {e}")
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description='Push active products to every enabled country')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the last unfinished run, skipping confirmed listings')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for sharded pushing (default: 1, in-process)')
+    parser.add_argument('--shard-size', type=int, default=500, help='SKUs per (country, SKU-range) shard')
+    parser.add_argument('--no-image-check', action='store_true', help='Push image links without checking them')
+    args = parser.parse_args()
+    
+    main(resume=args.resume, workers=args.workers, shard_size=args.shard_size,
+         check_images=not args.no_image_check)
@@ -0,0 +1,227 @@
+"""
+Multi-Merchant Sync - Push the catalog to several Merchant Center accounts at once
+Accounts come from merchants.json (see merchants.py). One process:
+
+- loads products.json and checks image links once for all accounts
+- formats each (country, pricing config) listing set once; accounts with
+  the same country settings share the same Content API bodies, accounts
+  with their own multipliers/currencies get prices from their own config
+- pushes every account concurrently through GMCManager.batch_push, each
+  with its own quota (max_workers calls in flight, calls_per_minute)
+- keeps each account's country/data-source table and push state apart, so
+  an account only gets the products that changed since its own last push,
+  plus every product in countries that are new to it or whose currency,
+  shipping or data source changed (--full pushes everything)
+"""
+import sys
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import database
+from catalog import CountryTable, RegionalPrices, load_records
+from data_source_registry import get_country_table
+from gmc_manager import GMCManager
+from image_validator import broken_images, strip_broken
+from merchants import load_merchants
+from price_stock_sync import product_state
+from reconcile import is_active, failed_batch_ids
+from update_global_prices import calculate_regional_price, load_country_config
+
+load_dotenv()
+
+# Country settings that do not change the listing body
+_ACCOUNT_KEYS = ('data_source_id', 'enabled', 'notes')
+
+def pricing_key(config):
+    """Everything in a country config that affects regional prices or listing bodies."""
+    countries = {code: {k: v for k, v in cfg.items() if k not in _ACCOUNT_KEYS}
+                 for code, cfg in config.get('countries', {}).items()}
+    return json.dumps([config.get('base_exchange_from_inr', 0.012), countries], sort_keys=True)
+
+def reprice(products, config):
+    """Copies of products with usd_price/regional_prices computed from another account's config."""
+    countries = config.get('countries', {})
+    base_exchange = config.get('base_exchange_from_inr', 0.012)
+    table = CountryTable(countries)
+    priced = []
+    for product in products:
+        usd_price = round(float(product.get('minprice', 0)) * base_exchange, 2)
+        regional = RegionalPrices(table, [calculate_regional_price(usd_price, cfg) for cfg in countries.values()])
+        if isinstance(product, dict):
+            priced.append(dict(product, usd_price=usd_price, regional_prices=regional))
+            continue
+        view = copy.copy(product)
+        view.usd_price = usd_price
+        view.regional_prices = regional
+        priced.append(view)
+    return priced
+
+class FormatCache:
+    """
+    Content API bodies per (country, listing-relevant config), each formatted
+    once. One cache per pricing group: the bodies take their prices from the
+    products it holds.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def bodies(self, country, cfg, indices):
+        """Bodies for the products at indices, in that order."""
+        shared_cfg = {k: v for k, v in cfg.items() if k not in _ACCOUNT_KEYS}
+        key = (country, json.dumps(shared_cfg, sort_keys=True))
+        with self._lock:
+            cached = self._bodies.setdefault(key, {})
+            for i in indices:
+                if i not in cached:
+                    cached[i] = GMCManager.format_catalog_product(self.products[i], country, cfg)
+            return [cached[i] for i in indices]
+
+def listing_hash(country, cfg):
+    """Everything in a country's settings that its listings carry: currency, shipping, data source, feed label."""
+    settings = {k: v for k, v in cfg.items() if k not in ('enabled', 'notes')}
+    return hashlib.sha1(json.dumps([country, settings], sort_keys=True).encode('utf-8')).hexdigest()
+
+def sync_merchant(merchant, countries, products, states, cache, full=False, batch_size=5000):
+    """
+    Push changed products of one account, and every product to countries
+    that are new or whose listing settings changed. Returns a summary dict.
+    """
+    name = merchant['name']
+    namespace = merchant['state_namespace']
+    summary = {'name': name, 'products': 0, 'ok': 0, 'fail': 0, 'errors': []}
+
+    pushed = database.get_push_state(namespace)
+    changed = [i for i, p in enumerate(products)
+               if full or tuple(pushed.get(p['code']) or ()) != states[i]]
+    listed = database.get_country_state(merchant['merchant_id'])
+    listings = {code: listing_hash(code, cfg) for code, cfg in countries.items()}
+    refresh = [code for code in countries if full or listed.get(code) != listings[code]]
+    if refresh and not full:
+        print(f"[{name}] New or changed country settings: {refresh}")
+
+    targets = {code: range(len(products)) if code in refresh else changed for code in countries}
+    touched = sorted(set().union(*targets.values())) if targets else []
+    summary['products'] = len(touched)
+    if not touched:
+        print(f"[{name}] Up to date")
+        return summary
+
+    bodies = []
+    owners = []
+    for code, cfg in countries.items():
+        indices = list(targets[code])
+        bodies.extend(cache.bodies(code, cfg, indices))
+        owners.extend((i, code) for i in indices)
+
+    gmc = GMCManager(merchant['merchant_id'], merchant['key_file'],
+                     batch_workers=merchant['max_workers'], calls_per_minute=merchant['calls_per_minute'])
+    print(f"[{name}] Pushing {len(touched)} products, {len(bodies)} listings")
+    ok, fail, errors = gmc.batch_push(bodies, batch_size=batch_size)
+
+    # Only products whose every country landed count as pushed, and only
+    # countries whose every product landed count as up to date
+    failures = [owners[idx] for idx in failed_batch_ids(errors)]
+    failed = {i for i, _ in failures}
+    failed_countries = {code for _, code in failures}
+    database.set_push_state([(products[i]['code'],) + states[i] for i in touched if i not in failed],
+                            namespace)
+    database.set_country_state(merchant['merchant_id'], {code: listings[code] for code in refresh
+                                                         if code not in failed_countries})
+    summary.update(ok=ok, fail=fail, errors=errors[:10])
+    return summary
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Push the catalog to every account in merchants.json')
+    parser.add_argument('--full', action='store_true', help='Push every active product, not only changes')
+    parser.add_argument('--only', nargs='*', help='Account names or merchant IDs to sync')
+    parser.add_argument('--no-image-check', action='store_true', help='Push image links without checking them')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    merchants = load_merchants()
+    if args.only:
+        merchants = [m for m in merchants if m['name'] in args.only or m['merchant_id'] in args.only]
+    if not merchants:
+        print("[ERROR] No accounts: create merchants.json or set GMC_MERCHANT_ID")
+        return
+
+    print("=" * 70)
+    print(f"MULTI-MERCHANT SYNC - {len(merchants)} accounts")
+    print("=" * 70)
+
+    # Per-account country tables, validated before anything is pushed
+    tables = {}
+    configs = {}
+    for m in merchants:
+        config = configs[m['merchant_id']] = load_country_config(m['country_config'])
+        countries, problems = get_country_table(m['merchant_id'], config,
+                                                m['data_sources'], key_file=m['key_file'])
+        if problems:
+            print(f"[{m['name']}] Skipped, data source check failed:")
+            for problem in problems:
+                print(f"  - {problem}")
+            continue
+        tables[m['merchant_id']] = countries
+        print(f"[{m['name']}] Countries: {list(countries.keys())}")
+    merchants = [m for m in merchants if m['merchant_id'] in tables]
+
+    # Shared by every account: one catalog load and one image check
+    products = [p for p in load_records('products.json') if is_active(p)]
+    broken = set()
+    if not args.no_image_check:
+        try:
+            broken = broken_images(products)
+        except Exception as e:
+            print(f"[IMAGES] Image check skipped: {e}")
+        if broken:
+            print(f"[IMAGES] {len(broken)} broken image URLs left out of the payloads")
+    print(f"[INFO] Active products: {len(products)}")
+
+    # Shared by accounts with the same pricing: products.json is priced with
+    # country_config.json; accounts with other multipliers/currencies get
+    # their own repriced copy, state pass and formatted bodies
+    catalog_pricing = pricing_key(load_country_config())
+    groups = {}
+    for m in merchants:
+        key = pricing_key(configs[m['merchant_id']])
+        if key in groups:
+            continue
+        priced = products if key == catalog_pricing else reprice(products, configs[m['merchant_id']])
+        listed = [strip_broken(p, broken) for p in priced] if broken else priced
+        groups[key] = (priced, [product_state(p) for p in priced], FormatCache(listed))
+
+    start_time = time.time()
+    summaries = []
+    if merchants:
+        with ThreadPoolExecutor(max_workers=len(merchants)) as pool:
+            futures = [pool.submit(sync_merchant, m, tables[m['merchant_id']],
+                                   *groups[pricing_key(configs[m['merchant_id']])], args.full, args.batch_size)
+                       for m in merchants]
+            for m, future in zip(merchants, futures):
+                try:
+                    summaries.append(future.result())
+                except Exception as e:
+                    summaries.append({'name': m['name'], 'products': 0, 'ok': 0, 'fail': 0,
+                                      'errors': [f"sync failed: {e}"]})
+
+    print("\n" + "=" * 70)
+    print("MULTI-MERCHANT SYNC COMPLETE!")
+    print("=" * 70)
+    for s in summaries:
+        print(f"  {s['name']}: {s['products']} products | ✓ {s['ok']} | ✗ {s['fail']}")
+        for e in s['errors'][:5]:
+            print(f"      - {e}")
+    print(f"⏱ Time: {time.time() - start_time:.2f} seconds")
+    print("=" * 70)
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,154 @@
+"""
+Price & Stock Sync - Fast lane for repricing and stock changes
+Compares each active product with what was last pushed (product_flags in
+gmc_state.db) and sends only price + availability, as Content API partial
+updates (custombatch method=update with an updateMask), for every enabled
+country. Products whose other attributes changed need a full push
+(multi_country_push.py / reconcile.py) and are only reported here.
+
+Run after update_global_prices.py or a stock import.
+"""
+import sys
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+import database
+from catalog import load_records, product_availability
+from gmc_manager import GMCManager
+from reconcile import get_sync_countries, is_active, failed_batch_ids
+from update_global_prices import load_country_config
+
+load_dotenv()
+
+# Attributes only a full push sends; a change here takes the product off the fast lane
+CONTENT_FIELDS = (
+    'productname', 'produrltitle', 'brand', 'indepthdescn', 'briedfdescn',
+    'featured_img', 'additional_images',
+)
+
+def _hash(value):
+    blob = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+def product_state(product):
+    """(inr, usd, aud, availability, price_hash, content_hash) as stored in product_flags."""
+    regional = product.get('regional_prices', {})
+    return (
+        float(product.get('minprice', 0)),
+        float(product.get('usd_price', 0)),
+        float(regional.get('AU', {}).get('price', 0)),
+        product_availability(product),
+        _hash({code: rp.get('price', 0) for code, rp in regional.items()}),
+        _hash({field: product.get(field) for field in CONTENT_FIELDS}),
+    )
+
+def classify(products, pushed):
+    """
+    Split active products by what changed since the last push.
+    Returns (fast, full): lists of (product, state). fast = price/stock only.
+    """
+    fast = []
+    full = []
+    for product in products:
+        if not is_active(product):
+            continue
+        state = product_state(product)
+        last = pushed.get(product['code'])
+        if last is None or last[5] != state[5]:
+            full.append((product, state))
+        elif tuple(last[:5]) != state[:5]:
+            fast.append((product, state))
+    return fast, full
+
+def partial_updates(product, countries):
+    """(product_id, partial body) for each enabled country."""
+    updates = []
+    availability = product_availability(product)
+    for code, cfg in countries.items():
+        price = product.get('regional_prices', {}).get(code, {}).get('price', 0)
+        updates.append((f"online:en:{code}:{product['code']}-{code}", {
+            'price': {'value': f"{price:.2f}", 'currency': cfg['currency']},
+            'availability': availability,
+        }))
+    return updates
+
+def record_baseline(products):
+    """Store the current state of every active product as pushed (after a full push)."""
+    database.set_push_state([(p['code'],) + product_state(p) for p in products if is_active(p)])
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Push price and stock changes as partial updates')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be sent')
+    parser.add_argument('--baseline', action='store_true',
+                        help='Record the current catalog as pushed (run after a full push)')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    products = load_records('products.json')
+
+    if args.baseline:
+        record_baseline(products)
+        print(f"[BASELINE] Recorded push state for {sum(1 for p in products if is_active(p))} products")
+        return
+
+    merchant_id = os.getenv('GMC_MERCHANT_ID')
+    if not merchant_id:
+        print("[ERROR] GMC_MERCHANT_ID not set in .env file!")
+        return
+
+    print("=" * 70)
+    print("PRICE & STOCK FAST LANE")
+    print("=" * 70)
+
+    countries = get_sync_countries(load_country_config())
+    fast, full = classify(products, database.get_push_state())
+    disabled = database.get_disabled_skus()
+    if disabled:
+        excluded = sum(1 for product, _ in fast if product['code'] in disabled)
+        fast = [(product, state) for product, state in fast if product['code'] not in disabled]
+        if excluded:
+            print(f"[INFO] {excluded} changed SKUs are disabled in product_flags, skipped")
+    print(f"[INFO] Price/stock only: {len(fast)} | Needs full push: {len(full)}")
+
+    if not fast or args.dry_run:
+        if full:
+            print("[INFO] Run multi_country_push.py or reconcile.py for products with other changes")
+        return
+
+    start_time = time.time()
+    gmc = GMCManager(merchant_id, 'service_account.json')
+
+    updates = []
+    owners = []
+    for product, state in fast:
+        for update in partial_updates(product, countries):
+            updates.append(update)
+            owners.append(product['code'])
+
+    ok, fail, errors = gmc.batch_update(updates, batch_size=args.batch_size)
+
+    # Only products whose every country landed count as pushed
+    failed_skus = {owners[idx] for idx in failed_batch_ids(errors)}
+    database.set_push_state([(product['code'],) + state for product, state in fast
+                             if product['code'] not in failed_skus])
+
+    elapsed = time.time() - start_time
+    print("\n" + "=" * 70)
+    print("FAST LANE COMPLETE!")
+    print("=" * 70)
+    print(f"✓ Updated: {ok} listings ({len(fast) - len(failed_skus)} products)")
+    print(f"✗ Failed:  {fail}")
+    print(f"⏱ Time:    {elapsed:.2f} seconds")
+    print("=" * 70)
+
+    if errors:
+        print(f"\n[ERRORS] First {min(10, len(errors))} errors:")
+        for e in errors[:10]:
+            print(f"  - {e}")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,102 @@
+"""
+Push Journal - Checkpoints for resumable push runs
+Records which (offer ID, payload hash) pairs a run has confirmed in the
+push_runs / push_journal tables of gmc_state.db. Writes are buffered and
+committed in batches, so journaling costs a few commits per thousand items.
+
+A resumed run skips offers already confirmed with the same payload and
+retries everything else: failed items and items that were in flight (pushed
+but not yet confirmed in the journal) when the previous run died.
+"""
+import hashlib
+import time
+import database
+
+def payload_hash(payload):
+    """Hash a serialized payload (bytes or str)."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+class PushJournal:
+    def __init__(self, merchant_id, resume=False, commit_every=500):
+        self.merchant_id = str(merchant_id)
+        self.commit_every = commit_every
+        self.resumed = False
+        self.retrying = 0
+        self._buffer = []
+        self._confirmed = {}
+
+        database.init_db()
+        self.conn = database.connect()
+
+        row = None
+        if resume:
+            row = self.conn.execute(
+                '''SELECT run_id FROM push_runs WHERE merchant_id=? AND status='running'
+                   ORDER BY run_id DESC LIMIT 1''', (self.merchant_id,)).fetchone()
+
+        if row:
+            self.run_id = row[0]
+            self.resumed = True
+            for offer_id, h, status in self.conn.execute(
+                    'SELECT offer_id, payload_hash, status FROM push_journal WHERE run_id=?', (self.run_id,)):
+                if status == 'ok':
+                    self._confirmed[offer_id] = h
+                else:
+                    self.retrying += 1
+        else:
+            # Starting over: earlier unfinished runs can no longer be resumed
+            self.conn.execute(
+                "UPDATE push_runs SET status='abandoned' WHERE merchant_id=? AND status='running'",
+                (self.merchant_id,))
+            cur = self.conn.execute(
+                "INSERT INTO push_runs (merchant_id, started_at, status) VALUES (?, ?, 'running')",
+                (self.merchant_id, time.time()))
+            self.run_id = cur.lastrowid
+            self.conn.commit()
+
+    @property
+    def confirmed_count(self):
+        return len(self._confirmed)
+
+    def is_confirmed(self, offer_id, payload_hash):
+        """True if this run already pushed this exact payload."""
+        return self._confirmed.get(offer_id) == payload_hash
+
+    def confirmed_subset(self, offer_ids):
+        """{offer_id: payload_hash} of confirmed offers among offer_ids (for shard workers)."""
+        return {o: self._confirmed[o] for o in offer_ids if o in self._confirmed}
+
+    def record(self, offer_id, payload_hash, ok, error=None):
+        """Buffer an outcome; flushed every commit_every records."""
+        if ok:
+            self._confirmed[offer_id] = payload_hash
+        self._buffer.append((self.run_id, offer_id, payload_hash,
+                             'ok' if ok else 'failed', error, time.time()))
+        if len(self._buffer) >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        self.conn.executemany('''INSERT OR REPLACE INTO push_journal
+                                 (run_id, offer_id, payload_hash, status, error, updated_at)
+                                 VALUES (?, ?, ?, ?, ?, ?)''', self._buffer)
+        self.conn.commit()
+        self._buffer = []
+
+    def finish(self):
+        """
+        Mark the run complete; a later --resume starts a fresh run. Only call
+        this when nothing failed, else the failures could not be resumed.
+        """
+        self.flush()
+        self.conn.execute("UPDATE push_runs SET status='complete', finished_at=? WHERE run_id=?",
+                          (time.time(), self.run_id))
+        self.conn.commit()
+
+    def close(self):
+        """Flush pending records without completing the run (safe on crash paths)."""
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,188 @@
+"""
+Reconcile - Sync GMC to the local catalog with the minimal change set
+Compares active products x enabled countries (country_config.json) with the
+mirrored GMC inventory (inventory_mirror.py) and computes:
+
+- inserts: offers missing from GMC
+- updates: offers whose pushed attributes drifted
+- deletes: orphaned offers in GMC that the catalog no longer produces
+
+Changes go out through the Content API custombatch endpoint, so a full sync
+costs only as much as the actual drift. Dry run by default; pass --apply.
+"""
+import sys
+import os
+import time
+from dotenv import load_dotenv
+from catalog import load_records
+from gmc_manager import GMCManager
+from image_validator import broken_images, strip_broken
+from inventory_mirror import InventoryMirror, content_api_pages, canonical_from_content, fingerprint
+from update_global_prices import load_country_config
+
+load_dotenv()
+
+def get_sync_countries(config):
+    """Countries enabled in country_config.json."""
+    return {code: cfg for code, cfg in config.get('countries', {}).items() if cfg.get('enabled', False)}
+
+def is_active(product):
+    return str(product.get('gmc_active', 'yes')).lower() == 'yes'
+
+def content_product_id(offer_id, feed_label, product_id=None):
+    """REST product ID for the Content API from whatever ID the mirror holds."""
+    if product_id and product_id.startswith('accounts/'):
+        # Merchant API name: accounts/{a}/products/online~en~US~PRD-00001-US
+        return product_id.rsplit('/', 1)[-1].replace('~', ':')
+    return product_id or f"online:en:{feed_label}:{offer_id}"
+
+def failed_batch_ids(errors):
+    """Collect the batchIds that failed from a GMCManager batch result."""
+    failed = set()
+    for error in errors:
+        if 'batchId' in error:
+            failed.add(error['batchId'])
+        failed.update(error.get('batchIds', []))
+    return failed
+
+def build_desired(gmc, products, countries):
+    """
+    Fingerprint every listing the catalog should produce.
+    Returns {(offer_id, feed_label): (fingerprint, product, country)}; bodies are
+    not kept, they are re-formatted only for offers that need pushing.
+    """
+    desired = {}
+    for product in products:
+        if not is_active(product):
+            continue
+        for code, cfg in countries.items():
+            body = gmc.format_catalog_product(product, code, cfg)
+            desired[(body['offerId'], code)] = (fingerprint(canonical_from_content(body)), product, code)
+    return desired
+
+def compute_plan(desired, live):
+    """Diff desired listings against the mirror. Returns (inserts, updates, deletes) key lists."""
+    inserts = []
+    updates = []
+    for key, (fp, _, _) in desired.items():
+        current = live.get(key)
+        if current is None:
+            inserts.append(key)
+        elif current[0] != fp:
+            updates.append(key)
+    deletes = [key for key in live if key not in desired]
+    return inserts, updates, deletes
+
+def apply_plan(gmc, mirror, desired, live, plan, countries, batch_size=5000):
+    """Push inserts/updates and delete orphans, writing confirmed results through to the mirror."""
+    inserts, updates, deletes = plan
+    summary = {'pushed': 0, 'push_failed': 0, 'deleted': 0, 'delete_failed': 0, 'errors': []}
+
+    push_keys = inserts + updates
+    if push_keys:
+        bodies = []
+        for key in push_keys:
+            _, product, code = desired[key]
+            bodies.append(gmc.format_catalog_product(product, code, countries[code]))
+        ok, fail, errors = gmc.batch_push(bodies, batch_size=batch_size)
+        failed = failed_batch_ids(errors)
+        mirror.record([
+            (body['offerId'], body['feedLabel'],
+             content_product_id(body['offerId'], body['feedLabel']),
+             None, canonical_from_content(body))
+            for idx, body in enumerate(bodies) if idx not in failed
+        ])
+        summary['pushed'] += ok
+        summary['push_failed'] += fail
+        summary['errors'].extend(errors)
+
+    if deletes:
+        product_ids = [content_product_id(offer_id, feed_label, live[(offer_id, feed_label)][1])
+                       for offer_id, feed_label in deletes]
+        ok, fail, errors = gmc.batch_delete(product_ids, batch_size=batch_size)
+        failed = failed_batch_ids(errors)
+        mirror.remove([key for idx, key in enumerate(deletes) if idx not in failed])
+        summary['deleted'] += ok
+        summary['delete_failed'] += fail
+        summary['errors'].extend(errors)
+
+    return summary
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Reconcile GMC inventory with products.json')
+    parser.add_argument('--apply', action='store_true', help='Apply the change set (default: dry run)')
+    parser.add_argument('--no-delete', action='store_true', help='Never delete orphaned offers')
+    parser.add_argument('--max-age', type=float, default=900,
+                        help='Re-list GMC if the mirror is older than this many seconds (0 = always)')
+    parser.add_argument('--no-image-check', action='store_true', help='Push image links without checking them')
+    args = parser.parse_args()
+
+    merchant_id = os.getenv('GMC_MERCHANT_ID')
+    if not merchant_id:
+        print("[ERROR] GMC_MERCHANT_ID not set in .env file!")
+        return
+
+    print("=" * 70)
+    print("RECONCILE - Local catalog vs Google Merchant Center")
+    print("=" * 70)
+
+    gmc = GMCManager(merchant_id, 'service_account.json')
+    mirror = InventoryMirror(merchant_id)
+
+    countries = get_sync_countries(load_country_config())
+    print(f"[CONFIG] Enabled countries: {list(countries.keys())}")
+
+    products = load_records('products.json')
+    if not args.no_image_check:
+        # Desired listings leave out image links known to be broken
+        try:
+            broken = broken_images([p for p in products if is_active(p)])
+        except Exception as e:
+            print(f"[IMAGES] Image check skipped: {e}")
+            broken = set()
+        if broken:
+            print(f"[IMAGES] {len(broken)} broken image URLs left out of the payloads")
+            products = [strip_broken(p, broken) for p in products]
+
+    start_time = time.time()
+    results = mirror.refresh({'content_api': lambda: content_api_pages(gmc)}, max_age=args.max_age)
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            print(f"[ERROR] Could not list GMC inventory ({name}): {result}")
+            return
+        print(f"[MIRROR] {name}: {result} offers listed")
+
+    desired = build_desired(gmc, products, countries)
+    live = mirror.fingerprints()
+    inserts, updates, deletes = compute_plan(desired, live)
+    if args.no_delete:
+        deletes = []
+
+    print(f"[PLAN] Desired: {len(desired)} | Live: {len(live)}")
+    print(f"[PLAN] Insert: {len(inserts)} | Update: {len(updates)} | Delete: {len(deletes)} | "
+          f"Unchanged: {len(desired) - len(inserts) - len(updates)}")
+
+    if not args.apply:
+        print("\nDry run - pass --apply to send these changes.")
+        return
+
+    summary = apply_plan(gmc, mirror, desired, live, (inserts, updates, deletes), countries)
+    elapsed = time.time() - start_time
+
+    print("\n" + "=" * 70)
+    print("RECONCILE COMPLETE!")
+    print("=" * 70)
+    print(f"✓ Pushed:  {summary['pushed']} (✗ {summary['push_failed']})")
+    print(f"✓ Deleted: {summary['deleted']} (✗ {summary['delete_failed']})")
+    print(f"⏱ Time:    {elapsed:.2f} seconds")
+    print("=" * 70)
+
+    if summary['errors']:
+        print(f"\n[ERRORS] First {min(10, len(summary['errors']))} errors:")
+        for e in summary['errors'][:10]:
+            print(f"  - {e}")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
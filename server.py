@@ -1,52 +1,96 @@
-import sys
-import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-
-from flask import Flask, jsonify, send_from_directory, send_file
+import gc
+import hmac
+import os
+from flask import Flask, Blueprint, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
+from dotenv import load_dotenv
 import database
+from catalog import CatalogStore, FACET_FIELDS
+from credentials_provider import get_credentials
 from gmc_manager import GMCManager
-import json
-import os
-from dotenv import load_dotenv
+from sync_queue import SyncQueue, get_ticket, release_tickets
 
 load_dotenv()
-app = Flask(__name__, static_folder='website')
-# Allow CORS for all origins (update with specific Vercel URL in production)
-CORS(app, resources={r"/*": {"origins": "*"}})
 
 # CONFIGURATION
 MERCHANT_ID = os.getenv('GMC_MERCHANT_ID')
+# POST /api/sync requires "Authorization: Bearer <token>"; without a token it is disabled
+SYNC_API_TOKEN = os.getenv('SYNC_API_TOKEN')
+SYNC_MAX_SKUS = int(os.getenv('SYNC_MAX_SKUS', 1000))
+
+# SHARED STATE
+# Loaded once by create_app(). Under a pre-fork server (gunicorn --preload)
+# this happens in the master, so workers share the parsed catalog
+# copy-on-write instead of each parsing products.json. When the file
+# changes, each process swaps in a new snapshot in the background.
+catalog_store = CatalogStore()
+shared_state_loaded = False
+
+# PER-WORKER STATE
+# API clients hold sockets and must not cross a fork; init_worker() builds
+# them in each worker process.
+gmc_bot = None
+sync_queue = None
 
-print("=" * 60)
-print("GMC INFINITE-BATCH SERVER - One-Way Push Mode")
-print("=" * 60)
+bp = Blueprint('store', __name__)
 
-# INITIALIZATION
-# Initialize Database
-database.init_db()
 
-# Initialize GMC Manager
-gmc_bot = None
-try:
-    if os.getenv('GOOGLE_CREDENTIALS'):
-        # Create temp file from env var
-        with open('service_account.json', 'w') as f:
-            f.write(os.getenv('GOOGLE_CREDENTIALS'))
-    
-    # Strictly require service account
-    gmc_bot = GMCManager(MERCHANT_ID, 'service_account.json')
-    print("✅ GMC Manager initialized successfully")
-except Exception as e:
-    print(f"❌ GMC Init failed: {e}")
-    # We still allow server to start but key features will fail
+def load_shared_state():
+    """Initialize state shared by all workers. Runs before forking."""
+    global shared_state_loaded
+    database.init_db()
+    # No worker runs yet: unfinished sync tickets are left over from the last run
+    released = release_tickets()
+    if released:
+        print(f"[SYNC] {released} unfinished sync tickets from the last run will be queued again")
+    catalog = catalog_store.load()
+    shared_state_loaded = True
+    print(f"[INFO] Catalog loaded: {len(catalog)} products")
+
+
+def init_worker():
+    """Initialize per-process state. Runs in each worker after fork."""
+    global gmc_bot, sync_queue
+    gmc_bot = None
+    sync_queue = None
+    try:
+        # Strictly require service account: service_account.json, else the
+        # GOOGLE_CREDENTIALS env var (credentials_provider). The Content API
+        # client is built on the first push call.
+        gmc_bot = GMCManager(MERCHANT_ID, credentials=get_credentials())
+        # Flusher thread starts on the first /api/sync request in this worker
+        sync_queue = SyncQueue(gmc_bot, catalog_store)
+        adopted = sync_queue.adopt()
+        if adopted:
+            print(f"[SYNC] Picked up {adopted} unfinished sync tickets")
+        print("✅ GMC Manager initialized successfully")
+    except Exception as e:
+        print(f"❌ GMC Init failed: {e}")
+        # We still allow server to start but key features will fail
 
 
+def create_app():
+    """WSGI app factory, e.g. gunicorn -c gunicorn.conf.py "server:create_app()"."""
+    print("=" * 60)
+    print("GMC INFINITE-BATCH SERVER - One-Way Push Mode")
+    print("=" * 60)
+
+    if not shared_state_loaded:
+        load_shared_state()
+        # Move everything loaded so far out of the GC's reach, so collections
+        # in the workers don't touch (and un-share) the catalog's pages.
+        gc.freeze()
+
+    app = Flask(__name__, static_folder='website')
+    # Allow CORS for all origins (update with specific Vercel URL in production)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    app.register_blueprint(bp)
+    return app
 
 
 # --- ENDPOINTS ---
 
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'ok',
@@ -54,17 +98,22 @@ def health_check():
     })
 
 # --- STATIC FILE SERVING (Keep website working) ---
-@app.route('/')
+@bp.route('/')
 def serve_home():
     return send_from_directory('website', 'index.html')
 
 
 
-@app.route('/website/<path:filename>')
+@bp.route('/products/<slug>')
+def serve_product_page(slug):
+    # Pre-rendered by static_pages.py; per-country pages are /products/<slug>/<CC>.html
+    return send_from_directory(os.path.join('website', 'products'), f"{slug}/index.html")
+
+@bp.route('/website/<path:filename>')
 def serve_website(filename):
     return send_from_directory('website', filename)
 
-@app.route('/<path:filename>')
+@bp.route('/<path:filename>')
 def serve_root_files(filename):
     # Serve files from website folder for simple paths
     if os.path.exists(os.path.join('website', filename)):
@@ -72,18 +121,69 @@ def serve_root_files(filename):
     return "Not found", 404
 
 # --- API ENDPOINTS (for website) ---
-@app.route('/api/products', methods=['GET'])
-@app.route('/api/products', methods=['GET'])
+QUERY_PARAMS = set(FACET_FIELDS) | {'min_price', 'max_price', 'offset', 'limit'}
+
+@bp.route('/api/products', methods=['GET'])
 def api_products():
-    try:
-        with open('products.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return jsonify({'products': data.get('products', [])})
-    except Exception as e:
-        print(f"Error reading products: {e}")
-        return jsonify({'products': []})
+    catalog = catalog_store.current()
+    if not QUERY_PARAMS.intersection(request.args):
+        # Body is serialized once per snapshot and shared by every request
+        return Response(catalog.products_json, mimetype='application/json')
+
+    # Filtered browsing: ?category_id=5,6&brand_id=100&free_shipping=true
+    # &min_price=100&max_price=500&offset=0&limit=100 (limit=0: counts only)
+    filters = {field: request.args[field].split(',') for field in FACET_FIELDS if request.args.get(field)}
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(0, request.args.get('limit', 100, type=int)), 1000)
+
+    total, products, facets = catalog.query(filters, min_price, max_price, offset, limit)
+    return jsonify({
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'products': products,
+        'facets': facets
+    })
+
+@bp.route('/api/sync', methods=['POST'])
+def api_sync():
+    """Queue SKUs for pushing to every enabled country: {"skus": ["PRD-00001", ...]}"""
+    if not SYNC_API_TOKEN:
+        return jsonify({'error': 'sync disabled: SYNC_API_TOKEN not set'}), 503
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {SYNC_API_TOKEN}"):
+        return jsonify({'error': 'unauthorized'}), 401
+    if sync_queue is None:
+        return jsonify({'error': 'GMC not initialized'}), 503
+
+    payload = request.get_json(silent=True) or {}
+    skus = payload.get('skus')
+    if not isinstance(skus, list) or not skus or not all(isinstance(sku, str) and sku for sku in skus):
+        return jsonify({'error': 'expected {"skus": ["PRD-00001", ...]}'}), 400
+    if len(skus) > SYNC_MAX_SKUS:
+        return jsonify({'error': f"at most {SYNC_MAX_SKUS} SKUs per request"}), 413
+
+    ticket_id, count = sync_queue.submit(skus)
+    return jsonify({
+        'ticket': ticket_id,
+        'queued': count,
+        'status_url': f"/api/sync/{ticket_id}"
+    }), 202
+
+@bp.route('/api/sync/<ticket_id>', methods=['GET'])
+def api_sync_status(ticket_id):
+    ticket = get_ticket(ticket_id)
+    if ticket is None:
+        return jsonify({'error': 'unknown ticket'}), 404
+    return jsonify(ticket)
 
 if __name__ == '__main__':
+    import sys
+    sys.stdout.reconfigure(encoding='utf-8')
+
+    app = create_app()
+    init_worker()
     port = int(os.getenv('PORT', 5000))
     print(f"\n🚀 GMC Server Running on port {port}...")
     print(f"[INFO] Website: http://localhost:{port}/")
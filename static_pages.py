@@ -0,0 +1,310 @@
+"""
+Static Pages - Pre-rendered product landing pages
+Renders the GMC landing pages as small static HTML files, so a shopper
+arriving from Google gets the product without downloading and scanning the
+whole catalog in the browser.
+
+- website/products/{slug}/{COUNTRY}.html: one page per enabled country of
+  country_config.json, priced from the product's regional_prices; the link
+  of that country's GMC listing (catalog.landing_page), so the page shows
+  the offer's price and currency
+- website/products/{slug}/index.html: base-currency page, served at
+  /products/{slug} and used as every page's canonical link
+- Incremental: a product is re-rendered only when its updated_dt, prices,
+  stock or slug changed (tracked in the static_page_state table of
+  gmc_state.db) or its files are missing; pages of removed products are deleted
+- Rendering runs on a process pool (--workers)
+
+Run after update_global_prices.py.
+"""
+import sys
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html import escape
+import database
+from catalog import product_availability
+from reconcile import get_sync_countries
+from update_global_prices import load_country_config
+
+PAGES_DIR = os.path.join('website', 'products')
+
+# Bump when the template changes to re-render every page
+PAGE_VERSION = 1
+
+FALLBACK_IMAGE = 'https://via.placeholder.com/400?text=No+Image'
+
+def page_slug(product):
+    """URL slug of the product page (same as the GMC link), or None if unusable as a path."""
+    slug = str(product.get('produrltitle') or product.get('code') or '')
+    if not slug or slug.startswith('.') or '/' in slug or '\\' in slug:
+        return None
+    return slug
+
+def default_country(config, countries):
+    """Country whose page is served at /products/{slug}: the base currency's, else the first enabled."""
+    base = config.get('base_currency', 'USD')
+    for code, cfg in countries.items():
+        if cfg['currency'] == base:
+            return code
+    return next(iter(countries), None)
+
+# Product fields render_page() shows
+PAGE_FIELDS = (
+    'code', 'productname', 'indepthdescn', 'briedfdescn', 'metadesc', 'brand',
+    'category', 'featured_img', 'free_shipping',
+)
+
+def page_signature(product, slug, countries):
+    """Everything render_page() uses, so any visible change re-renders the page."""
+    regional = product.get('regional_prices') or {}
+    blob = json.dumps([
+        PAGE_VERSION,
+        slug,
+        {field: product.get(field) for field in PAGE_FIELDS},
+        {code: regional.get(code) for code in countries},
+        {code: (cfg['currency'], cfg['symbol'], cfg.get('shipping_cost')) for code, cfg in countries.items()},
+        product_availability(product),
+    ], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+def render_page(product, slug, country, countries):
+    """HTML for one product in one country."""
+    cfg = countries[country]
+    rp = (product.get('regional_prices') or {}).get(country) or {}
+    price = rp.get('price', 0)
+    symbol = rp.get('symbol', cfg['symbol'])
+    currency = cfg['currency']
+    shipping = rp.get('shipping', cfg.get('shipping_cost'))
+
+    name = escape(str(product.get('productname', 'Unknown Product')))
+    description = escape(str(product.get('indepthdescn') or product.get('briedfdescn') or 'Premium quality product.'))
+    brand = escape(str(product.get('brand') or 'Generic'))
+    category = escape(str(product.get('category') or 'General'))
+    image = escape(str(product.get('featured_img') or FALLBACK_IMAGE))
+    availability = product_availability(product)
+    url_slug = escape(slug)
+
+    structured = json.dumps({
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': product.get('productname', ''),
+        'sku': product.get('code', ''),
+        'image': product.get('featured_img', ''),
+        'brand': {'@type': 'Brand', 'name': product.get('brand') or 'Generic'},
+        'offers': {
+            '@type': 'Offer',
+            'price': f"{price:.2f}",
+            'priceCurrency': currency,
+            'availability': 'https://schema.org/' + ('InStock' if availability == 'in stock' else 'OutOfStock'),
+        },
+    }).replace('</', '<\\/')
+
+    switcher = ' | '.join(
+        f'<a href="/products/{url_slug}/{code}.html">{escape(code)} ({escape(c["currency"])})</a>'
+        if code != country else f'<strong>{escape(code)} ({escape(c["currency"])})</strong>'
+        for code, c in countries.items()
+    )
+    shipping_line = ''
+    if product.get('free_shipping'):
+        shipping_line = '<p style="font-size:12px; color:green;">✓ Free Shipping</p>'
+    elif shipping is not None:
+        shipping_line = f'<p style="font-size:12px;">✓ Shipping: {escape(symbol)}{shipping} {escape(currency)}</p>'
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{name}</title>
+    <meta name="description" content="{escape(str(product.get('metadesc') or product.get('briedfdescn') or ''))}">
+    <link rel="canonical" href="/products/{url_slug}">
+    <link rel="stylesheet" href="/style.css">
+    <script type="application/ld+json">{structured}</script>
+</head>
+
+<body>
+
+    <div class="container">
+        <header>
+            <a href="/index.html" class="brand">[STORE_NAME]</a>
+            <nav>
+                <ul>
+                    <li><a href="/index.html">Back to Catalog</a></li>
+                </ul>
+            </nav>
+        </header>
+
+        <div class="split-view">
+            <div class="main-image">
+                <img src="{image}" alt="{name}" onerror="this.src='{FALLBACK_IMAGE}'">
+            </div>
+            <div class="details">
+                <small style="color:#888; text-transform:uppercase; font-size:10px; letter-spacing:1px;">SKU: {escape(str(product.get('code', '')))}</small>
+                <h1 style="margin-top:10px;">{name}</h1>
+                <p>{description}</p>
+
+                <div style="font-size: 24px; font-weight: bold; margin: 30px 0;">
+                    {escape(symbol)}{price:.2f} <span style="font-size:12px; color:#999;">{escape(currency)}</span>
+                </div>
+
+                <button class="btn-primary"{'' if availability == 'in stock' else ' disabled'}>{'Add to Order' if availability == 'in stock' else 'Out of Stock'}</button>
+
+                <div style="margin-top: 40px; border-top: 1px solid #eee; padding-top: 20px;">
+                    <p style="font-size:12px;">✓ Brand: {brand}</p>
+                    <p style="font-size:12px;">✓ Category: {category}</p>
+                    {shipping_line}
+                </div>
+
+                <p style="font-size:12px; margin-top: 20px;">{switcher}</p>
+            </div>
+        </div>
+    </div>
+
+</body>
+
+</html>
+"""
+
+def _write(path, text):
+    # Replace, never truncate in place: a page is always complete for readers
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def render_product(product, slug, countries, default, out_dir=PAGES_DIR):
+    """Write every page of one product."""
+    product_dir = os.path.join(out_dir, slug)
+    os.makedirs(product_dir, exist_ok=True)
+    for country in countries:
+        html = render_page(product, slug, country, countries)
+        _write(os.path.join(product_dir, f"{country}.html"), html)
+        if country == default:
+            _write(os.path.join(product_dir, 'index.html'), html)
+
+def render_chunk(jobs, countries, default, out_dir=PAGES_DIR):
+    """Render (product, slug, signature) jobs. Returns [(code, slug, signature, error)]."""
+    results = []
+    for product, slug, signature in jobs:
+        try:
+            render_product(product, slug, countries, default, out_dir)
+            results.append((product['code'], slug, signature, None))
+        except Exception as e:
+            results.append((product['code'], slug, signature, str(e)[:80]))
+    return results
+
+def iter_render_results(jobs, countries, default, out_dir=PAGES_DIR, workers=1, chunk_size=200):
+    """Yield render_chunk results per chunk; chunks run on a process pool when workers > 1."""
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    if workers <= 1:
+        for chunk in chunks:
+            yield render_chunk(chunk, countries, default, out_dir)
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(render_chunk, chunk, countries, default, out_dir) for chunk in chunks]
+        for future in as_completed(futures):
+            yield future.result()
+
+def build_pages(products_path='products.json', out_dir=PAGES_DIR, workers=1, force=False):
+    """
+    Render pages for changed products and remove pages of products that are gone.
+    Returns a summary dict.
+    """
+    config = load_country_config()
+    countries = get_sync_countries(config)
+    default = default_country(config, countries)
+    summary = {'rendered': 0, 'unchanged': 0, 'removed': 0, 'failed': 0, 'skipped': 0, 'errors': []}
+    if not countries:
+        print("[PAGES] No enabled countries in country_config.json")
+        return summary
+
+    with open(products_path, 'r', encoding='utf-8') as f:
+        products = json.load(f).get('products', [])
+
+    database.init_db()
+    conn = database.connect()
+    try:
+        previous = {code: (slug, signature) for code, slug, signature
+                    in conn.execute('SELECT code, slug, signature FROM static_page_state')}
+
+        jobs = []
+        current = {}
+        for product in products:
+            code = product.get('code')
+            slug = page_slug(product)
+            if not code or slug is None:
+                summary['skipped'] += 1
+                continue
+            current[code] = slug
+            signature = page_signature(product, slug, countries)
+            index_path = os.path.join(out_dir, slug, 'index.html')
+            if not force and previous.get(code) == (slug, signature) and os.path.exists(index_path):
+                summary['unchanged'] += 1
+                continue
+            jobs.append((product, slug, signature))
+
+        os.makedirs(out_dir, exist_ok=True)
+        for results in iter_render_results(jobs, countries, default, out_dir, workers):
+            rows = []
+            for code, slug, signature, error in results:
+                if error:
+                    summary['failed'] += 1
+                    summary['errors'].append(f"{code}: {error}")
+                    continue
+                rows.append((code, slug, signature, time.time()))
+            conn.executemany('''INSERT OR REPLACE INTO static_page_state
+                                (code, slug, signature, rendered_at) VALUES (?, ?, ?, ?)''', rows)
+            conn.commit()
+            summary['rendered'] += len(rows)
+
+        # Products removed from the catalog, or whose slug changed
+        live_slugs = set(current.values())
+        stale = [(code, slug) for code, (slug, _) in previous.items()
+                 if current.get(code) != slug]
+        for code, slug in stale:
+            if slug not in live_slugs:
+                shutil.rmtree(os.path.join(out_dir, slug), ignore_errors=True)
+            if code not in current:
+                conn.execute('DELETE FROM static_page_state WHERE code=?', (code,))
+            summary['removed'] += 1
+        conn.commit()
+    finally:
+        conn.close()
+    return summary
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Render static product pages per enabled country')
+    parser.add_argument('--out', default=PAGES_DIR, help='Output directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Render processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Re-render every product')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("STATIC PRODUCT PAGES")
+    print("=" * 70)
+
+    start = time.time()
+    summary = build_pages(out_dir=args.out, workers=args.workers, force=args.force)
+    print(f"✓ Rendered:  {summary['rendered']}")
+    print(f"  Unchanged: {summary['unchanged']}")
+    print(f"  Removed:   {summary['removed']}")
+    print(f"✗ Failed:    {summary['failed']} (skipped {summary['skipped']} without code/slug)")
+    print(f"⏱ Time:      {time.time() - start:.2f} seconds")
+    print("=" * 70)
+
+    for e in summary['errors'][:10]:
+        print(f"  - {e}")
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
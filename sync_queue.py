@@ -0,0 +1,247 @@
+"""
+Sync Queue - On-demand SKU pushes for the web server
+POST /api/sync hands SKUs to a SyncQueue, which coalesces them and pushes
+micro-batches to every enabled country with GMCManager.batch_push:
+
+- A batch is flushed when SYNC_MAX_BATCH SKUs are pending or the oldest has
+  waited SYNC_MAX_WAIT seconds; a SKU queued twice before its flush is
+  pushed once
+- Products are taken from the server's current catalog snapshot at flush
+  time, so the latest edit is what gets sent
+- Every request gets a ticket, stored in the sync_tickets table of
+  gmc_state.db, so any worker can answer GET /api/sync/<ticket>
+
+Each server process has its own queue and flusher thread, started on first use.
+A ticket's pending SKUs only live in the queue of the process that took the
+request (sync_tickets.owner), so unfinished tickets of a process that is gone
+are released (release_tickets: for every process at server start, for one
+worker from gunicorn's child_exit) and queued again by the next worker that
+starts (SyncQueue.adopt).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+import database
+from gmc_manager import GMCManager
+from price_stock_sync import product_state
+from reconcile import get_sync_countries, is_active
+from update_global_prices import load_country_config
+
+SYNC_MAX_BATCH = int(os.getenv('SYNC_MAX_BATCH', 500))
+SYNC_MAX_WAIT = float(os.getenv('SYNC_MAX_WAIT', 2.0))
+
+UNFINISHED = ('queued', 'running')
+
+def ticket_status(results):
+    """Final status of a ticket from its {sku: result}."""
+    ok = sum(1 for r in results.values() if r == 'ok')
+    return 'done' if ok == len(results) else 'partial' if ok else 'failed'
+
+def release_tickets(owner=None):
+    """
+    Hand back unfinished tickets of a process that is gone (owner: its pid;
+    None: every process, before any worker runs), so SyncQueue.adopt picks
+    them up. Returns the number of tickets released.
+    """
+    conn = database.connect()
+    try:
+        if owner is None:
+            cur = conn.execute('UPDATE sync_tickets SET owner=NULL WHERE status IN (?, ?)', UNFINISHED)
+        else:
+            cur = conn.execute('UPDATE sync_tickets SET owner=NULL WHERE status IN (?, ?) AND owner=?',
+                               UNFINISHED + (str(owner),))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+def get_ticket(ticket_id):
+    """Ticket as a dict, or None."""
+    conn = database.connect()
+    try:
+        row = conn.execute('''SELECT ticket_id, status, skus, results, created_at, updated_at
+                              FROM sync_tickets WHERE ticket_id=?''', (ticket_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        'ticket': row[0],
+        'status': row[1],
+        'skus': json.loads(row[2]),
+        'results': json.loads(row[3] or '{}'),
+        'created_at': row[4],
+        'updated_at': row[5],
+    }
+
+class SyncQueue:
+    def __init__(self, gmc, catalog_store, max_batch=SYNC_MAX_BATCH, max_wait=SYNC_MAX_WAIT):
+        self.gmc = gmc
+        self.catalog_store = catalog_store
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending = {}   # sku -> ticket ids, in arrival order
+        self._first_at = None
+        self._tickets = {}   # ticket id -> {'remaining': set of skus, 'results': {sku: result}}
+        self._thread = None
+
+    def submit(self, skus):
+        """Queue SKUs for pushing. Returns (ticket_id, unique SKU count)."""
+        skus = list(dict.fromkeys(str(sku) for sku in skus if sku))
+        ticket_id = uuid.uuid4().hex
+        now = time.time()
+
+        conn = database.connect()
+        try:
+            conn.execute('''INSERT INTO sync_tickets (ticket_id, status, skus, results, created_at, updated_at,
+                                                     owner)
+                            VALUES (?, ?, ?, '{}', ?, ?, ?)''',
+                         (ticket_id, 'queued' if skus else 'done', json.dumps(skus), now, now, str(os.getpid())))
+            conn.commit()
+        finally:
+            conn.close()
+        if not skus:
+            return ticket_id, 0
+
+        with self._cond:
+            self._enqueue(ticket_id, skus, {})
+        return ticket_id, len(skus)
+
+    def adopt(self):
+        """Queue the unfinished tickets released by release_tickets. Returns the number adopted."""
+        owner = str(os.getpid())
+        conn = database.connect()
+        try:
+            conn.execute('UPDATE sync_tickets SET owner=? WHERE owner IS NULL AND status IN (?, ?)',
+                         (owner,) + UNFINISHED)
+            rows = conn.execute('''SELECT ticket_id, skus, results FROM sync_tickets
+                                   WHERE owner=? AND status IN (?, ?)''', (owner,) + UNFINISHED).fetchall()
+            conn.commit()
+
+            adopted = 0
+            with self._cond:
+                for ticket_id, skus, results in rows:
+                    if ticket_id in self._tickets:
+                        continue
+                    results = json.loads(results or '{}')
+                    remaining = [sku for sku in json.loads(skus) if sku not in results]
+                    if remaining:
+                        self._enqueue(ticket_id, remaining, results)
+                    else:
+                        conn.execute('UPDATE sync_tickets SET status=?, updated_at=? WHERE ticket_id=?',
+                                     (ticket_status(results), time.time(), ticket_id))
+                    adopted += 1
+            conn.commit()
+            return adopted
+        finally:
+            conn.close()
+
+    def _enqueue(self, ticket_id, skus, results):
+        """Add a ticket's SKUs to the pending set. Caller holds self._cond."""
+        self._tickets[ticket_id] = {'remaining': set(skus), 'results': results}
+        for sku in skus:
+            self._pending.setdefault(sku, set()).add(ticket_id)
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='sync-queue', daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _next_batch(self):
+        """Block until a batch is due. Returns {sku: ticket ids}."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            while len(self._pending) < self.max_batch:
+                remaining = self._first_at + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = {}
+            for sku in list(self._pending)[:self.max_batch]:
+                batch[sku] = self._pending.pop(sku)
+            self._first_at = time.monotonic() if self._pending else None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.push(batch)
+            except Exception as e:
+                results = {sku: f"error: {e}"[:200] for sku in batch}
+            try:
+                self._finish(batch, results)
+            except Exception as e:
+                print(f"[SYNC] Could not record results for {len(batch)} SKUs: {e}")
+
+    def push(self, skus):
+        """Push SKUs to every enabled country. Returns {sku: 'ok' | reason}."""
+        catalog = self.catalog_store.current()
+        countries = get_sync_countries(load_country_config())
+
+        results = {}
+        bodies = []
+        owners = []
+        for sku in skus:
+            product = catalog.get(sku)
+            if product is None:
+                results[sku] = 'not found'
+            elif not is_active(product):
+                results[sku] = 'inactive'
+            else:
+                for code, cfg in countries.items():
+                    bodies.append(GMCManager.format_catalog_product(product, code, cfg))
+                    owners.append(sku)
+        if not bodies:
+            return results
+
+        ok, fail, errors = self.gmc.batch_push(bodies)
+        for error in errors:
+            message = error.get('batch_error') or str(error.get('errors', {}).get('message', error))
+            ids = error.get('batchIds') or [error.get('batchId')]
+            for idx in ids:
+                results.setdefault(owners[idx], f"error: {message}"[:200])
+        pushed = [sku for sku in dict.fromkeys(owners) if sku not in results]
+        for sku in pushed:
+            results[sku] = 'ok'
+
+        # Keep the price/stock fast lane baseline in step
+        database.set_push_state([(sku,) + product_state(catalog.get(sku)) for sku in pushed])
+        print(f"[SYNC] {len(skus)} SKUs: {len(pushed)} pushed, {ok} listings ok, {fail} failed")
+        return results
+
+    def _finish(self, batch, results):
+        """Record results on every ticket that asked for these SKUs."""
+        updates = []
+        with self._cond:
+            for sku, ticket_ids in batch.items():
+                for ticket_id in ticket_ids:
+                    ticket = self._tickets.get(ticket_id)
+                    if ticket is None:
+                        continue
+                    ticket['results'][sku] = results.get(sku, 'error: no result')
+                    ticket['remaining'].discard(sku)
+            for ticket_id in {t for ticket_ids in batch.values() for t in ticket_ids}:
+                ticket = self._tickets.get(ticket_id)
+                if ticket is None:
+                    continue
+                if ticket['remaining']:
+                    status = 'running'
+                else:
+                    del self._tickets[ticket_id]
+                    status = ticket_status(ticket['results'])
+                updates.append((status, json.dumps(ticket['results']), time.time(), ticket_id))
+
+        conn = database.connect()
+        try:
+            conn.executemany('UPDATE sync_tickets SET status=?, results=?, updated_at=? WHERE ticket_id=?',
+                             updates)
+            conn.commit()
+        finally:
+            conn.close()
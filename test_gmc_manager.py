@@ -0,0 +1,79 @@
+"""
+GMC Manager tests - custombatch chunking against a stub Content API service
+Run: python -m pytest -q test_gmc_manager.py (or python -m unittest)
+"""
+import socket
+import threading
+import unittest
+import gmc_manager
+from gmc_manager import GMCManager
+
+class StubService:
+    """products().custombatch(body=...).execute() that times out above max_entries."""
+
+    def __init__(self, max_entries, error=socket.timeout):
+        self.max_entries = max_entries
+        self.error = error
+        self.calls = []
+        self.landed = []
+        self._lock = threading.Lock()
+
+    def products(self):
+        return self
+
+    def custombatch(self, body):
+        self._body = body
+        return self
+
+    def execute(self):
+        entries = self._body['entries']
+        with self._lock:
+            self.calls.append(len(entries))
+            if len(entries) > self.max_entries:
+                raise self.error('timed out')
+            self.landed.extend(entry['batchId'] for entry in entries)
+        return {'entries': [{'batchId': entry['batchId']} for entry in entries]}
+
+class CustombatchTest(unittest.TestCase):
+    def setUp(self):
+        self._backoff = gmc_manager.CUSTOMBATCH_BACKOFF
+        gmc_manager.CUSTOMBATCH_BACKOFF = 0
+        self.manager = GMCManager('123', credentials=object(), batch_workers=1)
+
+    def tearDown(self):
+        gmc_manager.CUSTOMBATCH_BACKOFF = self._backoff
+
+    def push(self, service, count, batch_size):
+        self.manager._service = service
+        bodies = [{'offerId': f'PRD-{i:05d}-US'} for i in range(count)]
+        return self.manager.batch_push(bodies, batch_size=batch_size)
+
+    def test_timeout_splits_chunk(self):
+        service = StubService(max_entries=60)
+        success, fail, errors = self.push(service, 400, batch_size=400)
+        self.assertEqual((success, fail, errors), (400, 0, []))
+        self.assertEqual(sorted(service.landed), list(range(400)))
+        # The oversized chunk is not resent as is, and later chunks start smaller
+        self.assertEqual(service.calls.count(400), 1)
+        self.assertLessEqual(max(service.calls[2:]), 200)
+
+    def test_timeout_error_splits_chunk(self):
+        service = StubService(max_entries=60, error=TimeoutError)
+        self.assertEqual(self.push(service, 300, batch_size=300), (300, 0, []))
+
+    def test_connection_reset_retries_same_chunk(self):
+        service = StubService(max_entries=100)
+        failures = [ConnectionResetError('reset')]
+        execute = service.execute
+
+        def flaky():
+            if failures:
+                raise failures.pop()
+            return execute()
+
+        service.execute = flaky
+        self.assertEqual(self.push(service, 100, batch_size=100), (100, 0, []))
+        self.assertEqual(service.calls, [100])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Image Validator tests - check_urls against a local stub HTTP server
+Run: python -m pytest -q test_image_validator.py (or python -m unittest)
+"""
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from image_validator import check_urls
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        path = self.path.split('?')[0]
+        if path == '/ok.jpg':
+            self._reply(200, 'image/jpeg')
+        elif path == '/page.html':
+            self._reply(200, 'text/html')
+        elif path == '/moved.jpg':
+            self.send_response(301)
+            self.send_header('Location', '/ok.jpg')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif path == '/busy.jpg':
+            time.sleep(0.3)
+            self._reply(200, 'image/jpeg')
+        elif path == '/slow.jpg':
+            time.sleep(2)
+            self._reply(200, 'image/jpeg')
+        elif path == '/error.jpg':
+            self._reply(503, 'text/plain')
+        else:
+            self._reply(404, 'text/plain')
+
+    def _reply(self, status, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class CheckUrlsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def check(self, path, **kwargs):
+        [(url, ok, status)] = check_urls([self.base + path], **kwargs)
+        return ok, status
+
+    def test_ok(self):
+        self.assertEqual(self.check('/ok.jpg'), (True, 200))
+
+    def test_not_found_is_broken(self):
+        self.assertEqual(self.check('/missing.jpg'), (False, 404))
+
+    def test_redirect_is_followed(self):
+        self.assertEqual(self.check('/moved.jpg'), (True, 200))
+
+    def test_non_image_is_broken(self):
+        self.assertEqual(self.check('/page.html'), (False, 200))
+
+    def test_server_error_is_unknown(self):
+        self.assertEqual(self.check('/error.jpg'), (None, 503))
+
+    def test_timeout_is_unknown(self):
+        self.assertEqual(self.check('/slow.jpg', timeout=0.5), (None, None))
+
+    def test_queued_urls_do_not_time_out(self):
+        # Far more URLs than connections to the host: waiting for a free
+        # connection must not count against the timeout
+        urls = [f"{self.base}/busy.jpg?n={i}" for i in range(20)]
+        results = check_urls(urls, per_host=2, timeout=1)
+        self.assertTrue(all(ok for _, ok, _ in results))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Sync Queue tests - ticket hand-over between server processes, against a temporary gmc_state.db
+Run: python -m pytest -q test_sync_queue.py (or python -m unittest)
+"""
+import json
+import os
+import tempfile
+import time
+import unittest
+import database
+from sync_queue import SyncQueue, get_ticket, release_tickets
+
+class StubGMC:
+    def __init__(self):
+        self.pushed = []
+
+    def batch_push(self, bodies):
+        self.pushed.extend(body['offerId'] for body in bodies)
+        return len(bodies), 0, []
+
+class StubStore:
+    def __init__(self, products):
+        self.catalog = {p['code']: p for p in products}
+
+    def current(self):
+        return self.catalog
+
+class TicketRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._db_name = database.DB_NAME
+        database.DB_NAME = os.path.join(self._tmp.name, 'gmc_state.db')
+        database.init_db()
+        with open('products.json', 'r', encoding='utf-8') as f:
+            self.products = json.load(f)['products'][:3]
+        self.skus = [p['code'] for p in self.products]
+
+    def tearDown(self):
+        database.DB_NAME = self._db_name
+        self._tmp.cleanup()
+
+    def add_ticket(self, ticket_id, status, results, owner):
+        conn = database.connect()
+        conn.execute('''INSERT INTO sync_tickets (ticket_id, status, skus, results, created_at, updated_at, owner)
+                        VALUES (?, ?, ?, ?, 0, 0, ?)''',
+                     (ticket_id, status, json.dumps(self.skus), json.dumps(results), owner))
+        conn.commit()
+        conn.close()
+
+    def wait_final(self, ticket_id, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ticket = get_ticket(ticket_id)
+            if ticket['status'] not in ('queued', 'running'):
+                return ticket
+            time.sleep(0.05)
+        return get_ticket(ticket_id)
+
+    def test_tickets_of_a_dead_worker_are_pushed_by_the_next_one(self):
+        self.add_ticket('queued-ticket', 'queued', {}, owner='999999')
+        self.add_ticket('running-ticket', 'running', {self.skus[0]: 'ok'}, owner='999999')
+        self.add_ticket('live-ticket', 'queued', {}, owner='888888')
+
+        self.assertEqual(release_tickets(999999), 2)
+        gmc = StubGMC()
+        queue = SyncQueue(gmc, StubStore(self.products), max_wait=0.05)
+        self.assertEqual(queue.adopt(), 2)
+
+        for ticket_id in ('queued-ticket', 'running-ticket'):
+            ticket = self.wait_final(ticket_id)
+            self.assertEqual(ticket['status'], 'done')
+            self.assertEqual(set(ticket['results']), set(self.skus))
+        # Another live worker's ticket is left alone
+        self.assertEqual(get_ticket('live-ticket')['status'], 'queued')
+
+    def test_server_start_releases_every_unfinished_ticket(self):
+        self.add_ticket('done-ticket', 'done', {sku: 'ok' for sku in self.skus}, owner='999999')
+        self.add_ticket('queued-ticket', 'queued', {}, owner='888888')
+        self.assertEqual(release_tickets(), 1)
+        queue = SyncQueue(StubGMC(), StubStore(self.products), max_wait=0.05)
+        self.assertEqual(queue.adopt(), 1)
+        self.assertEqual(self.wait_final('queued-ticket')['status'], 'done')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Watch Pipeline tests - Pipeline.push against a stub GMC manager and a temporary gmc_state.db
+Run: python -m pytest -q test_watch_pipeline.py (or python -m unittest)
+"""
+import copy
+import json
+import os
+import tempfile
+import time
+import unittest
+import database
+import watch_pipeline
+from watch_pipeline import Pipeline
+
+class StubGMC:
+    """Records what would be sent; every call succeeds."""
+
+    def __init__(self):
+        self.pushed = []
+        self.updated = []
+        self.deleted = []
+
+    def batch_push(self, bodies):
+        self.pushed.extend(body['offerId'] for body in bodies)
+        return len(bodies), 0, []
+
+    def batch_update(self, updates):
+        self.updated.extend(product_id for product_id, _ in updates)
+        return len(updates), 0, []
+
+    def batch_delete(self, product_ids):
+        self.deleted.extend(product_ids)
+        return len(product_ids), 0, []
+
+def summary():
+    return {'pushed': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+
+class DisabledSkuTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._db_name = database.DB_NAME
+        database.DB_NAME = os.path.join(self._tmp.name, 'gmc_state.db')
+        database.init_db()
+
+        with open('products.json', 'r', encoding='utf-8') as f:
+            self.product = copy.deepcopy(json.load(f)['products'][0])
+        with open('country_config.json', 'r', encoding='utf-8') as f:
+            self.countries = {'US': json.load(f)['countries']['US']}
+        self.sku = self.product['code']
+        self.pipeline = Pipeline(push=True, pages=False, check_images=False)
+        self.gmc = self.pipeline._gmc = StubGMC()
+
+    def tearDown(self):
+        database.DB_NAME = self._db_name
+        self._tmp.cleanup()
+
+    def push(self, candidates, retired=()):
+        self.pipeline.push(candidates, set(retired), candidates, self.countries, {}, summary())
+
+    def test_disabled_sku_stays_disabled_after_retire_and_restore(self):
+        self.push([self.product])
+        self.assertEqual(self.gmc.pushed, [f"{self.sku}-US"])
+        database.set_flag(self.sku, enabled=False)
+
+        # Retired: its listing is deleted and its push state forgotten
+        self.push([], retired=[self.sku])
+        self.assertEqual(len(self.gmc.deleted), 1)
+        self.assertNotIn(self.sku, database.get_push_state())
+        self.assertIn(self.sku, database.get_disabled_skus())
+
+        # Restored: still disabled, so nothing is pushed
+        self.push([self.product])
+        self.assertEqual(self.gmc.pushed, [f"{self.sku}-US"])
+        self.assertIn(self.sku, database.get_disabled_skus())
+
+    def test_enabled_sku_is_pushed_again_after_restore(self):
+        self.push([self.product])
+        self.push([], retired=[self.sku])
+        self.push([self.product])
+        self.assertEqual(self.gmc.pushed, [f"{self.sku}-US"] * 2)
+
+class ConcurrentEditTest(unittest.TestCase):
+    def setUp(self):
+        with open('products.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with open('country_config.json', 'r', encoding='utf-8') as f:
+            config = f.read()
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self._db_name = database.DB_NAME
+        database.DB_NAME = os.path.join(self._tmp.name, 'gmc_state.db')
+        data['products'] = data['products'][:3]
+        with open('products.json', 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        with open('country_config.json', 'w', encoding='utf-8') as f:
+            f.write(config)
+        self._update_images = watch_pipeline.update_images
+
+    def tearDown(self):
+        watch_pipeline.update_images = self._update_images
+        database.DB_NAME = self._db_name
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_edit_during_run_is_not_overwritten(self):
+        calls = []
+
+        def update_images(products, conn, workers=1):
+            # The first run is interrupted by an edit saved to products.json
+            if not calls:
+                with open('products.json', 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data['products'][1]['productname'] = 'Edited during the run'
+                time.sleep(0.01)
+                with open('products.json', 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+            calls.append(len(products))
+            return len(products), {products[0]['code']}
+
+        watch_pipeline.update_images = update_images
+        pipeline = Pipeline(push=False, pages=False)
+        pipeline.run()
+
+        self.assertEqual(len(calls), 2)
+        with open('products.json', 'r', encoding='utf-8') as f:
+            products = json.load(f)['products']
+        self.assertEqual(products[1]['productname'], 'Edited during the run')
+        self.assertEqual(pipeline.snapshot[products[1]['code']]['productname'], 'Edited during the run')
+
+if __name__ == '__main__':
+    unittest.main()
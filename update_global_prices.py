@@ -6,13 +6,14 @@ Optionally fetches real-time exchange rates.
 import json
 import os
 from datetime import datetime
+from catalog import CountryTable, RegionalPrices, write_catalog
 
 # Optional: Uncomment to use real-time rates
 # import requests
 
-def load_country_config():
+def load_country_config(path='country_config.json'):
     """Load country configuration from JSON file."""
-    config_path = os.path.join(os.path.dirname(__file__), 'country_config.json')
+    config_path = os.path.join(os.path.dirname(__file__), path)
     with open(config_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -51,6 +52,32 @@ def calculate_regional_price(base_usd_price, country_config, live_rates=None):
     
     return round(base_usd_price * rate, 2)
 
+def price_product(product, countries, country_table, base_exchange, live_rates=None):
+    """Set usd_price and regional_prices of one product from its INR minprice."""
+    # Get base price in INR
+    inr_price = float(product.get('minprice', 0))
+
+    # Convert to USD (base currency)
+    usd_price = round(inr_price * base_exchange, 2)
+    product['usd_price'] = usd_price
+
+    # Calculate regional prices. Kept as one array per product; the
+    # per-country dicts are expanded only while saving (see catalog.py).
+    product['regional_prices'] = RegionalPrices(country_table, [
+        calculate_regional_price(usd_price, country_cfg, live_rates)
+        for country_cfg in countries.values()
+    ])
+
+def pricing_metadata(config, base_exchange):
+    countries = config.get('countries', {})
+    return {
+        'last_updated': datetime.now().isoformat(),
+        'base_currency': 'USD',
+        'inr_to_usd_rate': base_exchange,
+        'enabled_countries': [code for code, cfg in countries.items() if cfg.get('enabled', False)],
+        'total_countries_configured': len(countries)
+    }
+
 def update_global_prices(use_live_rates=False):
     """
     Update all products with regional prices for each configured country.
@@ -80,41 +107,18 @@ def update_global_prices(use_live_rates=False):
     enabled_countries = {code: cfg for code, cfg in countries.items() if cfg.get('enabled', False)}
     print(f"[INFO] Enabled countries: {list(enabled_countries.keys())}")
     
+    # Currency, symbol and shipping per country, shared by every product
+    country_table = CountryTable(countries)
+    
     # Update each product
     for product in products:
-        # Get base price in INR
-        inr_price = float(product.get('minprice', 0))
-        
-        # Convert to USD (base currency)
-        usd_price = round(inr_price * base_exchange, 2)
-        product['usd_price'] = usd_price
-        
-        # Calculate regional prices
-        product['regional_prices'] = {}
-        
-        for country_code, country_cfg in countries.items():
-            local_price = calculate_regional_price(usd_price, country_cfg, live_rates)
-            
-            product['regional_prices'][country_code] = {
-                'price': local_price,
-                'currency': country_cfg['currency'],
-                'symbol': country_cfg['symbol'],
-                'formatted': f"{country_cfg['symbol']}{local_price}",
-                'shipping': country_cfg['shipping_cost']
-            }
+        price_product(product, countries, country_table, base_exchange, live_rates)
     
     # Update metadata
-    data['pricing_metadata'] = {
-        'last_updated': datetime.now().isoformat(),
-        'base_currency': 'USD',
-        'inr_to_usd_rate': base_exchange,
-        'enabled_countries': list(enabled_countries.keys()),
-        'total_countries_configured': len(countries)
-    }
+    data['pricing_metadata'] = pricing_metadata(config, base_exchange)
     
     # Save updated products
-    with open('products.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    write_catalog(data, 'products.json')
     
     print(f"\n✅ Global prices updated for {len(products)} products")
     print(f"✅ Configured {len(countries)} countries ({len(enabled_countries)} enabled)")
@@ -0,0 +1,538 @@
+"""
+Watch Pipeline - Run the catalog pipeline when its inputs change
+Watches products.json, country_config.json and CSV uploads (uploads/*.csv).
+When a burst of changes has settled (DEBOUNCE seconds without a new change,
+at most MAX_DELAY after the first one), it runs only the stages the change
+needs, on only the products it touched:
+
+- CSV upload: rows are merged into products.json, then handled as an edit;
+  the file is moved to uploads/imported/ (uploads/failed/ if unreadable)
+- products.json edit: changed SKUs are repriced and, when new or renamed,
+  re-imaged (assign_product_images state), in one rewrite of the file
+- country_config.json edit: every product is repriced if pricing changed;
+  countries that were enabled or got a new currency/symbol/shipping get a
+  full push of the catalog
+- then static pages and catalog shards (both skip unchanged output) and the
+  GMC push: price/stock-only changes go out as partial updates (the
+  price_stock_sync fast lane), other changes as full inserts, and SKUs
+  deactivated (gmc_active) or removed from the catalog are deleted
+- a run that fails, or leaves listings unpushed, is repeated after
+  RETRY_DELAY seconds (sooner if another change comes in)
+
+The first pass after start-up treats every product as changed; the stages
+are incremental, so it only catches up on what was missed.
+
+Uses watchdog (inotify/FSEvents) when installed, else polls file mtimes.
+The pipeline's own writes to products.json are not treated as edits; an
+edit saved while a run is in progress makes that run start over on the new
+file instead of being overwritten.
+
+Upload CSV columns (header names are case-insensitive; extra columns ignored):
+    SKU, Product Name, Description, INR (or USD), GMC_Active
+
+Usage: python watch_pipeline.py [--once] [--poll] [--no-push]
+"""
+import sys
+import csv
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+from dotenv import load_dotenv
+import database
+from assign_product_images import update_images
+from catalog import CountryTable, write_catalog
+from catalog_shards import build_shards
+from gmc_manager import GMCManager
+from image_validator import broken_images, strip_broken
+from price_stock_sync import classify, partial_updates
+from reconcile import content_product_id, get_sync_countries, is_active, failed_batch_ids
+from static_pages import build_pages
+from update_global_prices import load_country_config, price_product, pricing_metadata
+
+load_dotenv()
+
+PRODUCTS_FILE = 'products.json'
+CONFIG_FILE = 'country_config.json'
+UPLOADS_DIR = os.getenv('GMC_UPLOADS_DIR', 'uploads')
+DEBOUNCE = float(os.getenv('PIPELINE_DEBOUNCE', 2.0))
+MAX_DELAY = float(os.getenv('PIPELINE_MAX_DELAY', 30.0))
+POLL_INTERVAL = 1.0
+# Seconds before a run that failed (or left listings unpushed) is repeated
+RETRY_DELAY = float(os.getenv('PIPELINE_RETRY_DELAY', 30.0))
+
+# Country settings that change prices only (fast lane) or nothing in the listing
+_PRICE_ONLY_KEYS = ('multiplier', 'data_source_id', 'enabled', 'notes')
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def is_upload(path, uploads_dir=UPLOADS_DIR):
+    return (os.path.dirname(os.path.abspath(path)) == os.path.abspath(uploads_dir)
+            and path.lower().endswith('.csv'))
+
+class ChangeWatcher:
+    """
+    Collects changed input files. Watchdog events (or a polling thread) only
+    trigger a scan; a file counts as changed when its (mtime, size, inode) differs
+    from the last one seen, so duplicate events and our own writes collapse.
+    """
+
+    def __init__(self, uploads_dir=UPLOADS_DIR, debounce=DEBOUNCE, max_delay=MAX_DELAY,
+                 poll_interval=POLL_INTERVAL, use_watchdog=True):
+        self.uploads_dir = uploads_dir
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog
+        self.mode = None
+        self._cond = threading.Condition()
+        self._dirty = set()
+        self._first_at = None
+        self._last_at = None
+        self._seen = {}
+        self._observer = None
+        self._stopped = threading.Event()
+
+    def _paths(self):
+        paths = [PRODUCTS_FILE, CONFIG_FILE]
+        try:
+            paths.extend(os.path.join(self.uploads_dir, name) for name in sorted(os.listdir(self.uploads_dir))
+                         if name.lower().endswith('.csv'))
+        except OSError:
+            pass
+        return paths
+
+    def scan(self):
+        """Mark files whose signature changed since the last scan."""
+        now = time.monotonic()
+        with self._cond:
+            for path in self._paths():
+                signature = file_signature(path)
+                if signature is None or self._seen.get(path) == signature:
+                    continue
+                self._seen[path] = signature
+                self._dirty.add(path)
+                self._last_at = now
+                if self._first_at is None:
+                    self._first_at = now
+            if self._dirty:
+                self._cond.notify()
+
+    def acknowledge(self, path):
+        """Forget a change we made ourselves (e.g. the pipeline's rewrite of products.json)."""
+        with self._cond:
+            self._seen[path] = file_signature(path)
+            self._dirty.discard(path)
+            if not self._dirty:
+                self._first_at = self._last_at = None
+
+    def start(self):
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        # Files present at start-up are handled by the first pass; uploads are
+        # left dirty so they get imported
+        with self._cond:
+            for path in self._paths():
+                self._seen[path] = file_signature(path)
+                if is_upload(path, self.uploads_dir):
+                    self._dirty.add(path)
+                    self._first_at = self._last_at = time.monotonic() - self.max_delay
+
+        if self.use_watchdog:
+            try:
+                from watchdog.events import FileSystemEventHandler
+                from watchdog.observers import Observer
+            except ImportError:
+                print("[WATCH] watchdog not installed, polling instead")
+            else:
+                watcher = self
+
+                class Handler(FileSystemEventHandler):
+                    def on_any_event(self, event):
+                        if not event.is_directory:
+                            watcher.scan()
+
+                self._observer = Observer()
+                self._observer.schedule(Handler(), os.path.dirname(os.path.abspath(PRODUCTS_FILE)),
+                                        recursive=False)
+                self._observer.schedule(Handler(), self.uploads_dir, recursive=False)
+                self._observer.start()
+                self.mode = 'watchdog'
+                return
+
+        threading.Thread(target=self._poll, name='pipeline-poll', daemon=True).start()
+        self.mode = 'polling'
+
+    def _poll(self):
+        while not self._stopped.wait(self.poll_interval):
+            self.scan()
+
+    def stop(self):
+        self._stopped.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    def wait(self, timeout=None):
+        """Block until changes have settled. Returns the changed paths (empty on timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._dirty:
+                    due = min(self._last_at + self.debounce, self._first_at + self.max_delay)
+                    if now >= due:
+                        break
+                    wait_for = due - now
+                else:
+                    wait_for = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return set()
+                    wait_for = deadline - now if wait_for is None else min(wait_for, deadline - now)
+                self._cond.wait(wait_for)
+
+            dirty = self._dirty
+            self._dirty = set()
+            self._first_at = self._last_at = None
+            return dirty
+
+def _slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', str(text).lower()).strip('-')
+
+def read_upload(path, base_exchange):
+    """{sku: product fields} from an uploaded CSV. Raises ValueError on bad prices."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+
+    updates = {}
+    for row in rows:
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()
+               if isinstance(value, str)}
+        sku = row.get('sku')
+        if not sku:
+            continue
+        fields = {}
+        if row.get('product name'):
+            fields['productname'] = row['product name']
+        if row.get('description'):
+            fields['briedfdescn'] = row['description']
+        if row.get('inr'):
+            fields['minprice'] = float(row['inr'])
+        elif row.get('usd'):
+            # Catalog prices are INR; regional prices are derived from it
+            fields['minprice'] = round(float(row['usd']) / base_exchange, 2)
+        if row.get('gmc_active'):
+            fields['gmc_active'] = 'yes' if row['gmc_active'].lower() in ('true', 'yes', '1') else 'no'
+        updates[sku] = fields
+    return updates
+
+def merge_upload(products, updates):
+    """Apply upload rows to the catalog in place. Returns (updated, added)."""
+    index = {p.get('code'): p for p in products}
+    today = date.today().isoformat()
+    updated = added = 0
+    for sku, fields in updates.items():
+        product = index.get(sku)
+        if product is None:
+            name = fields.get('productname', sku)
+            product = {'code': sku, 'productname': name, 'produrltitle': _slugify(name) or sku,
+                       'minprice': 0.0, 'gmc_active': 'yes', 'createddt': today}
+            products.append(product)
+            index[sku] = product
+            added += 1
+        elif all(product.get(k) == v for k, v in fields.items()):
+            continue
+        else:
+            updated += 1
+        product.update(fields)
+        # Static pages re-render on updated_dt
+        product['updated_dt'] = today
+    return updated, added
+
+def _listing_settings(cfg):
+    return {k: v for k, v in cfg.items() if k not in _PRICE_ONLY_KEYS}
+
+class Pipeline:
+    """Runs the stages for one batch of changed inputs. Keeps the last catalog it processed."""
+
+    def __init__(self, watcher=None, workers=1, push=True, pages=True, check_images=True,
+                 uploads_dir=UPLOADS_DIR):
+        self.watcher = watcher
+        self.workers = workers
+        self.push_enabled = push
+        self.pages_enabled = pages
+        self.check_images = check_images
+        self.uploads_dir = uploads_dir
+        self.snapshot = {}       # code -> product as last processed
+        self.pricing = None      # pricing settings of the last run
+        self.countries = None    # enabled country -> listing settings of the last run
+        self._gmc = None
+
+    def _gmc_manager(self):
+        if self._gmc is None:
+            merchant_id = os.getenv('GMC_MERCHANT_ID')
+            if not merchant_id:
+                return None
+            self._gmc = GMCManager(merchant_id, 'service_account.json')
+        return self._gmc
+
+    def _import_uploads(self, paths, products, base_exchange):
+        """Merge uploaded CSVs. Returns the paths imported (moved once the catalog is saved)."""
+        imported = []
+        for path in sorted(paths):
+            if not os.path.exists(path):
+                continue
+            try:
+                updates = read_upload(path, base_exchange)
+            except (OSError, ValueError, csv.Error) as e:
+                print(f"[UPLOAD] {os.path.basename(path)} rejected: {e}")
+                self._archive(path, 'failed')
+                continue
+            updated, added = merge_upload(products, updates)
+            print(f"[UPLOAD] {os.path.basename(path)}: {updated} updated, {added} new")
+            imported.append(path)
+        return imported
+
+    def _archive(self, path, folder):
+        target_dir = os.path.join(self.uploads_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+        os.replace(path, os.path.join(target_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.path.basename(path)}"))
+
+    def run(self, changed_paths=()):
+        """Process one batch of changes. Returns a summary dict."""
+        start = time.time()
+        summary = {'changed': 0, 'repriced': 0, 'reimaged': 0, 'pushed': 0, 'updated': 0, 'deleted': 0,
+                   'failed': 0}
+
+        config = load_country_config(CONFIG_FILE)
+        all_countries = config.get('countries', {})
+        base_exchange = config.get('base_exchange_from_inr', 0.012)
+        countries = get_sync_countries(config)
+        pricing = json.dumps([base_exchange, {code: _listing_settings(cfg) | {'multiplier': cfg.get('multiplier')}
+                                              for code, cfg in all_countries.items()}], sort_keys=True)
+        reprice_all = self.pricing is not None and pricing != self.pricing
+        listing = {code: _listing_settings(cfg) for code, cfg in countries.items()}
+        push_countries = {} if self.countries is None else {
+            code: cfg for code, cfg in countries.items() if self.countries.get(code) != listing[code]}
+
+        signature = file_signature(PRODUCTS_FILE)
+        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        products = data.setdefault('products', [])
+        uploads = [p for p in changed_paths if is_upload(p, self.uploads_dir)]
+        imported = self._import_uploads(uploads, products, base_exchange)
+
+        # SKUs that differ from what the last run left behind (all on the first run)
+        changed = [p for p in products if self.snapshot.get(p.get('code')) != p]
+        removed = self.snapshot.keys() - {p.get('code') for p in products}
+        summary['changed'] = len(changed)
+        touched = {p.get('code') for p in changed}
+
+        # Reprice
+        table = CountryTable(all_countries)
+        repriced = []
+        for product in products if reprice_all else changed:
+            old = (product.get('usd_price'), product.get('regional_prices'))
+            price_product(product, all_countries, table, base_exchange)
+            product['regional_prices'] = product['regional_prices'].to_dict()
+            if (product['usd_price'], product['regional_prices']) != old:
+                repriced.append(product.get('code'))
+        summary['repriced'] = len(repriced)
+        touched.update(repriced)
+
+        # Re-image new and renamed products
+        database.init_db()
+        conn = database.connect()
+        try:
+            _, reimaged = update_images(products, conn, self.workers)
+            if imported or repriced or reimaged:
+                if file_signature(PRODUCTS_FILE) != signature:
+                    # Edited while we worked: writing our copy would drop the edit.
+                    # Start over on the new file (image state is not committed)
+                    print(f"[PIPELINE] {PRODUCTS_FILE} changed during the run, starting over")
+                    return self.run(changed_paths)
+                if repriced:
+                    data['pricing_metadata'] = pricing_metadata(config, base_exchange)
+                write_catalog(data, PRODUCTS_FILE)
+                if self.watcher is not None:
+                    self.watcher.acknowledge(PRODUCTS_FILE)
+            conn.commit()
+        finally:
+            conn.close()
+        summary['reimaged'] = len(reimaged)
+        touched.update(reimaged)
+        for path in imported:
+            self._archive(path, 'imported')
+
+        if touched or push_countries:
+            print(f"[PIPELINE] {len(changed)} changed, {len(repriced)} repriced, {len(reimaged)} re-imaged"
+                  + (f", full push to {list(push_countries)}" if push_countries else ""))
+        if removed:
+            print(f"[PIPELINE] {len(removed)} products left the catalog")
+
+        if self.pages_enabled and (touched or reprice_all or push_countries):
+            pages = build_pages(PRODUCTS_FILE, workers=self.workers)
+            manifest, rebuilt = build_shards(PRODUCTS_FILE)
+            print(f"[PIPELINE] Pages: {pages['rendered']} rendered, {pages['removed']} removed"
+                  + (f" | Shards: build {manifest['build']}" if rebuilt else ""))
+
+        failed = set()
+        failed_countries = set()
+        if self.push_enabled and (touched or removed or push_countries):
+            retired = removed | {p.get('code') for p in changed if not is_active(p)}
+            failed, failed_countries = self.push([p for p in products if p.get('code') in touched], retired,
+                                                 products, countries, push_countries, summary)
+
+        # Only now is the batch done. SKUs and countries that failed to push
+        # keep looking changed, so the retry (or the next change) sends them again
+        self.snapshot = {p.get('code'): p for p in products if p.get('code') not in failed}
+        self.snapshot.update({code: None for code in removed & failed})
+        self.pricing = pricing
+        self.countries = {code: settings for code, settings in listing.items() if code not in failed_countries}
+        summary['seconds'] = round(time.time() - start, 2)
+        return summary
+
+    def push(self, candidates, retired, products, countries, push_countries, summary):
+        """
+        Fast lane for price/stock changes, full inserts for the rest and for
+        push_countries, deletes for retired SKUs (deactivated or removed).
+        Returns (SKUs to retry, countries whose full push did not fully land).
+        """
+        gmc = self._gmc_manager()
+        if gmc is None:
+            print("[PIPELINE] GMC_MERCHANT_ID not set, skipping push")
+            return set(), set()
+        pushed = database.get_push_state()
+        # SKUs switched off with set_flag are left alone, as in the price_stock_sync fast lane
+        disabled = database.get_disabled_skus()
+        fast, full = classify([p for p in candidates if p.get('code') not in disabled], pushed)
+
+        bodies = []
+        owners = []
+        full_codes = {product.get('code') for product, _ in full}
+        pushes = [(product, countries) for product, _ in full]
+        if push_countries:
+            pushes += [(product, push_countries) for product in products
+                       if is_active(product) and product.get('code') not in full_codes | disabled]
+        if pushes and self.check_images:
+            try:
+                broken = broken_images([product for product, _ in pushes])
+            except Exception as e:
+                print(f"[IMAGES] Image check skipped: {e}")
+                broken = set()
+            pushes = [(strip_broken(product, broken), targets) for product, targets in pushes]
+        for product, targets in pushes:
+            for code, cfg in targets.items():
+                bodies.append(GMCManager.format_catalog_product(product, code, cfg))
+                owners.append((product.get('code'), code))
+
+        # Countries getting a full push already carry the new prices
+        updates = []
+        update_owners = []
+        fast_countries = {code: cfg for code, cfg in countries.items() if code not in push_countries}
+        for product, _ in fast:
+            for update in partial_updates(product, fast_countries):
+                updates.append(update)
+                update_owners.append(product.get('code'))
+
+        # Listings of SKUs that were pushed but are now inactive or gone, as reconcile.py deletes them
+        retired = sorted(code for code in retired if code in pushed)
+        delete_ids = []
+        delete_owners = []
+        for sku in retired:
+            for code in countries:
+                delete_ids.append(content_product_id(f"{sku}-{code}", code))
+                delete_owners.append(sku)
+
+        failed = set()
+        failed_countries = set()
+        if bodies:
+            ok, fail, errors = gmc.batch_push(bodies)
+            for idx in failed_batch_ids(errors):
+                sku, code = owners[idx]
+                failed.add(sku)
+                if code in push_countries:
+                    failed_countries.add(code)
+            summary['pushed'] += ok
+            summary['failed'] += fail
+        if updates:
+            ok, fail, errors = gmc.batch_update(updates)
+            failed.update(update_owners[idx] for idx in failed_batch_ids(errors))
+            summary['updated'] += ok
+            summary['failed'] += fail
+        if delete_ids:
+            ok, fail, errors = gmc.batch_delete(delete_ids)
+            failed.update(delete_owners[idx] for idx in failed_batch_ids(errors))
+            summary['deleted'] += ok
+            summary['failed'] += fail
+
+        # Only products whose every listing landed count as pushed (or deleted)
+        database.set_push_state([(product['code'],) + state for product, state in fast + full
+                                 if product['code'] not in failed])
+        database.clear_push_state([sku for sku in retired if sku not in failed])
+        print(f"[PIPELINE] Push: {summary['pushed']} inserted, {summary['updated']} partial updates, "
+              f"{summary['deleted']} deleted, {summary['failed']} failed")
+        return failed, failed_countries
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the catalog pipeline whenever its inputs change')
+    parser.add_argument('--once', action='store_true', help='Run one catch-up pass and exit')
+    parser.add_argument('--poll', action='store_true', help='Poll file mtimes even if watchdog is installed')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE, help='Seconds of quiet before a run')
+    parser.add_argument('--uploads', default=UPLOADS_DIR, help='Directory watched for CSV uploads')
+    parser.add_argument('--workers', type=int, default=1, help='Processes for image assignment and pages')
+    parser.add_argument('--no-push', action='store_true', help='Update files only, do not push to GMC')
+    parser.add_argument('--no-pages', action='store_true', help='Skip static pages and catalog shards')
+    parser.add_argument('--no-image-check', action='store_true', help='Push image links without checking them')
+    args = parser.parse_args()
+
+    watcher = ChangeWatcher(uploads_dir=args.uploads, debounce=args.debounce, use_watchdog=not args.poll)
+    pipeline = Pipeline(watcher, workers=args.workers, push=not args.no_push, pages=not args.no_pages,
+                        check_images=not args.no_image_check, uploads_dir=args.uploads)
+
+    print("=" * 70)
+    print("CATALOG PIPELINE WATCHER")
+    print("=" * 70)
+    watcher.start()
+    print(f"[WATCH] {PRODUCTS_FILE}, {CONFIG_FILE}, {args.uploads}/*.csv ({watcher.mode})")
+
+    changed = watcher.wait(timeout=0)
+    retry = set()
+    try:
+        while True:
+            try:
+                summary = pipeline.run(changed | retry)
+                print(f"[PIPELINE] Done in {summary['seconds']}s")
+                ok = not summary['failed']
+            except Exception as e:
+                print(f"[PIPELINE] Run failed: {e}")
+                ok = False
+            if args.once:
+                break
+            if ok:
+                retry = set()
+                changed = watcher.wait()
+            else:
+                # Run again after RETRY_DELAY, or sooner if something else changes
+                retry |= changed
+                print(f"[PIPELINE] Retrying in {RETRY_DELAY:.0f}s")
+                changed = watcher.wait(timeout=RETRY_DELAY)
+                if not changed:
+                    continue
+            print(f"\n[WATCH] Changed: {', '.join(sorted(os.path.basename(p) for p in changed))}")
+    except KeyboardInterrupt:
+        print("\n[WATCH] Stopped")
+    finally:
+        watcher.stop()
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()